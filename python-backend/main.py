@@ -4,18 +4,24 @@ Free alternative to Adobe Scan & iLovePDF via WhatsApp.
 Run with: uvicorn main:app --reload --port 8000
 """
 
-import json
 import sys
+import time
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional
+import orjson
 from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from utils.flow import handle_message
-from utils.session import cleanup_expired, get_active_session_count
+from utils.flow import drain_message_queue, enqueue_messages, run_message_workers
+from utils.session import cleanup_expired, get_active_session_count, sweep_stale_blobs
+from utils.whatsapp import verify_webhook_token, close_http_client
+from utils.outbound import run_outbound_sender
+from utils.workers import shutdown_pool
 from utils.storage import (
     save_settings,
     get_settings,
@@ -25,14 +31,98 @@ from utils.storage import (
     get_feature_usage,
     get_user_analytics,
     get_error_tracking,
-    export_conversions_csv,
+    iter_conversions_csv,
+    run_conversion_log_writer,
 )
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="DocBot — WhatsApp Document Tool")
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+    logger.warning("psutil not installed — system health reports zeros")
+
+HEALTH_SAMPLE_INTERVAL = 5.0
+SESSION_CLEANUP_INTERVAL = 30.0
+
+# Latest psutil readings, refreshed by _health_loop() so the health
+# endpoint never blocks the event loop sampling CPU.
+_health_snapshot: dict = {}
+
+
+def _sample_system() -> dict:
+    """Take one non-blocking reading of CPU, memory and disk usage."""
+    mem = psutil.virtual_memory()
+    disk = psutil.disk_usage("/")
+    return {
+        "cpu_percent": psutil.cpu_percent(interval=None),
+        "memory_percent": mem.percent,
+        "memory_used_mb": round(mem.used / (1024 * 1024)),
+        "memory_total_mb": round(mem.total / (1024 * 1024)),
+        "disk_percent": disk.percent,
+        "disk_used_gb": round(disk.used / (1024 ** 3), 1),
+        "disk_total_gb": round(disk.total / (1024 ** 3), 1),
+    }
+
+
+async def _health_loop() -> None:
+    """Refresh _health_snapshot every HEALTH_SAMPLE_INTERVAL seconds."""
+    if not PSUTIL_AVAILABLE:
+        return
+
+    # The first interval=None call only primes the CPU counters
+    psutil.cpu_percent(interval=None)
+    while True:
+        try:
+            _health_snapshot.update(await asyncio.to_thread(_sample_system))
+        except Exception as e:
+            logger.error(f"System health sampling failed: {str(e)}")
+        await asyncio.sleep(HEALTH_SAMPLE_INTERVAL)
+
+
+async def _cleanup_loop() -> None:
+    """Sweep expired sessions every SESSION_CLEANUP_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(SESSION_CLEANUP_INTERVAL)
+        try:
+            cleanup_expired()
+        except Exception as e:
+            logger.error(f"Session cleanup failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweep_stale_blobs()
+    message_workers = asyncio.create_task(run_message_workers())
+    tasks = [
+        asyncio.create_task(_health_loop()),
+        asyncio.create_task(_cleanup_loop()),
+        asyncio.create_task(run_conversion_log_writer()),
+        asyncio.create_task(run_outbound_sender()),
+    ]
+    yield
+    # Finish queued and in-progress messages while the log writer and
+    # outbound sender they rely on are still running
+    await drain_message_queue()
+    message_workers.cancel()
+    await asyncio.gather(message_workers, return_exceptions=True)
+    for task in tasks:
+        task.cancel()
+    # Let the log writer and outbound sender flush anything still queued
+    await asyncio.gather(*tasks, return_exceptions=True)
+    shutdown_pool()
+    await close_http_client()
+
+
+app = FastAPI(
+    title="DocBot — WhatsApp Document Tool",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS for React frontend
 app.add_middleware(
@@ -45,6 +135,49 @@ app.add_middleware(
 
 _start_time = datetime.now()
 
+# Settings are read on every webhook; keep a short-lived copy in memory
+# instead of hitting the JSON file each time.
+SETTINGS_CACHE_TTL = 5.0
+_settings_cache = {"value": None, "masked_json": b"", "loaded_at": 0.0}
+
+# Dashboard stats are polled far more often than they change.
+STATS_CACHE_TTL = 2.0
+_stats_cache = {"body": b"", "built_at": 0.0}
+
+
+def _mask_settings(settings: dict) -> dict:
+    """Return a copy of settings with the access token masked for display."""
+    masked = dict(settings)
+    token = masked.get("access_token")
+    if token:
+        masked["access_token"] = token[:10] + "..." + token[-4:] if len(token) > 14 else "***"
+    return masked
+
+
+def _refresh_settings_cache() -> None:
+    now = time.monotonic()
+    if _settings_cache["value"] is None or now - _settings_cache["loaded_at"] > SETTINGS_CACHE_TTL:
+        settings = get_settings()
+        _settings_cache["value"] = settings
+        _settings_cache["masked_json"] = orjson.dumps(_mask_settings(settings))
+        _settings_cache["loaded_at"] = now
+
+
+def _cached_settings() -> dict:
+    """Return settings from the in-process cache, reloading once the TTL lapses."""
+    _refresh_settings_cache()
+    return _settings_cache["value"]
+
+
+def _cached_masked_settings_json() -> bytes:
+    """Return the serialized masked settings kept alongside the cached settings."""
+    _refresh_settings_cache()
+    return _settings_cache["masked_json"]
+
+
+def _invalidate_settings_cache() -> None:
+    _settings_cache["value"] = None
+
 
 class SettingsModel(BaseModel):
     whatsapp_business_account_id: str
@@ -63,39 +196,45 @@ async def verify_webhook(
     hub_challenge: str = Query(None, alias="hub.challenge"),
 ):
     """Webhook verification endpoint for Meta WhatsApp Cloud API."""
-    settings = get_settings()
-    verify_token = settings.get("webhook_verify_token", "")
+    if hub_mode != "subscribe":
+        logger.warning(f"Webhook verification failed. Mode: {hub_mode}")
+        raise HTTPException(status_code=403, detail="Verification failed")
+
+    verify_token = _cached_settings().get("webhook_verify_token", "")
+    if not await verify_webhook_token(hub_verify_token, verify_token):
+        logger.warning("Webhook verification failed: token mismatch")
+        raise HTTPException(status_code=403, detail="Verification failed")
 
-    if hub_mode == "subscribe" and hub_verify_token == verify_token:
-        logger.info("Webhook verified successfully")
-        return int(hub_challenge)
+    try:
+        challenge = int(hub_challenge)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid hub.challenge")
 
-    logger.warning(f"Webhook verification failed. Mode: {hub_mode}")
-    raise HTTPException(status_code=403, detail="Verification failed")
+    logger.info("Webhook verified successfully")
+    return challenge
 
 
 @app.post("/webhook/whatsapp")
 async def receive_message(request: Request):
     """Receive incoming messages from WhatsApp."""
     try:
-        body = await request.json()
-        logger.info(f"Received webhook: {json.dumps(body, indent=2)}")
-
-        cleanup_expired()
+        body = orjson.loads(await request.body())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Received webhook: %s", orjson.dumps(body).decode())
 
-        entry = body.get("entry", [{}])[0]
-        changes = entry.get("changes", [{}])[0]
-        value = changes.get("value", {})
-        messages = value.get("messages", [])
+        messages = [
+            message
+            for entry in body.get("entry", [])
+            for change in entry.get("changes", [])
+            for message in change.get("value", {}).get("messages", [])
+        ]
 
         if not messages:
             return {"status": "no messages"}
 
-        message = messages[0]
-        sender = message.get("from")
-        settings = get_settings()
-
-        await handle_message(message, sender, settings)
+        # Acknowledge right away; Meta redelivers webhooks that are slow to
+        # answer, so the messages are handled by background workers
+        await enqueue_messages(messages, _cached_settings())
 
         return {"status": "ok"}
 
@@ -109,23 +248,23 @@ async def receive_message(request: Request):
 @app.get("/api/admin/stats")
 async def get_admin_stats():
     """Get conversion statistics for the dashboard."""
-    return get_stats()
+    now = time.monotonic()
+    if not _stats_cache["body"] or now - _stats_cache["built_at"] > STATS_CACHE_TTL:
+        _stats_cache["body"] = orjson.dumps(get_stats())
+        _stats_cache["built_at"] = now
+    return Response(content=_stats_cache["body"], media_type="application/json")
 
 
 @app.get("/api/admin/conversions")
 async def get_admin_conversions():
     """Get list of recent conversions."""
-    return get_conversions()
+    return ORJSONResponse(get_conversions())
 
 
 @app.get("/api/admin/settings")
 async def get_admin_settings():
     """Get current settings (tokens masked)."""
-    settings = get_settings()
-    if settings.get("access_token"):
-        token = settings["access_token"]
-        settings["access_token"] = token[:10] + "..." + token[-4:] if len(token) > 14 else "***"
-    return settings
+    return Response(content=_cached_masked_settings_json(), media_type="application/json")
 
 
 @app.post("/api/admin/settings")
@@ -133,6 +272,7 @@ async def save_admin_settings(settings: SettingsModel):
     """Save Meta WhatsApp API settings."""
     try:
         save_settings(settings.model_dump())
+        _invalidate_settings_cache()
         return {"status": "success", "message": "Settings saved"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -143,75 +283,53 @@ async def save_admin_settings(settings: SettingsModel):
 @app.get("/api/admin/analytics/timeseries")
 async def get_analytics_timeseries(days: int = Query(30, ge=1, le=365)):
     """Get conversion counts by date for the last N days."""
-    return get_timeseries(days)
+    return ORJSONResponse(get_timeseries(days))
 
 
 @app.get("/api/admin/analytics/features")
 async def get_analytics_features():
     """Get feature usage breakdown."""
-    return get_feature_usage()
+    return ORJSONResponse(get_feature_usage())
 
 
 @app.get("/api/admin/analytics/users")
 async def get_analytics_users():
     """Get user-level analytics."""
-    return get_user_analytics()
+    return ORJSONResponse(get_user_analytics())
 
 
 @app.get("/api/admin/analytics/errors")
 async def get_analytics_errors():
     """Get error tracking data."""
-    return get_error_tracking()
+    return ORJSONResponse(get_error_tracking())
 
 
 # ============== SYSTEM HEALTH ==============
 
 @app.get("/api/admin/system/health")
 async def get_system_health():
-    """Get system resource usage."""
-    try:
-        import psutil
-
-        cpu = psutil.cpu_percent(interval=0.5)
-        mem = psutil.virtual_memory()
-        disk = psutil.disk_usage("/")
-        uptime = (datetime.now() - _start_time).total_seconds()
-
-        return {
-            "cpu_percent": cpu,
-            "memory_percent": mem.percent,
-            "memory_used_mb": round(mem.used / (1024 * 1024)),
-            "memory_total_mb": round(mem.total / (1024 * 1024)),
-            "disk_percent": disk.percent,
-            "disk_used_gb": round(disk.used / (1024 ** 3), 1),
-            "disk_total_gb": round(disk.total / (1024 ** 3), 1),
-            "uptime_seconds": int(uptime),
-            "python_version": sys.version.split()[0],
-            "active_sessions": get_active_session_count(),
-        }
-    except ImportError:
-        return {
-            "cpu_percent": 0,
-            "memory_percent": 0,
-            "memory_used_mb": 0,
-            "memory_total_mb": 0,
-            "disk_percent": 0,
-            "disk_used_gb": 0,
-            "disk_total_gb": 0,
-            "uptime_seconds": int((datetime.now() - _start_time).total_seconds()),
-            "python_version": sys.version.split()[0],
-            "active_sessions": get_active_session_count(),
-        }
+    """Get system resource usage from the latest background sample."""
+    return ORJSONResponse({
+        "cpu_percent": _health_snapshot.get("cpu_percent", 0),
+        "memory_percent": _health_snapshot.get("memory_percent", 0),
+        "memory_used_mb": _health_snapshot.get("memory_used_mb", 0),
+        "memory_total_mb": _health_snapshot.get("memory_total_mb", 0),
+        "disk_percent": _health_snapshot.get("disk_percent", 0),
+        "disk_used_gb": _health_snapshot.get("disk_used_gb", 0),
+        "disk_total_gb": _health_snapshot.get("disk_total_gb", 0),
+        "uptime_seconds": int((datetime.now() - _start_time).total_seconds()),
+        "python_version": sys.version.split()[0],
+        "active_sessions": get_active_session_count(),
+    })
 
 
 # ============== EXPORT ==============
 
 @app.get("/api/admin/conversions/export")
 async def export_conversions():
-    """Export all conversions as CSV."""
-    csv_data = export_conversions_csv()
-    return Response(
-        content=csv_data,
+    """Export all conversions as CSV, streamed row by row."""
+    return StreamingResponse(
+        iter_conversions_csv(),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=conversions.csv"},
     )
@@ -227,4 +345,6 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # loop/http "auto" pick uvloop and httptools when installed. Sessions
+    # live in process memory, so this must stay a single worker.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto")
@@ -1,13 +1,70 @@
 """Shared test fixtures — sample PDFs, images, etc."""
 
 import io
+import numpy as np
+import pikepdf
 import pytest
 from PIL import Image
 from reportlab.pdfgen import canvas as rl_canvas
 from reportlab.lib.pagesizes import letter
 
+import utils.session as session_store
+import utils.storage as storage
+from utils.flow import _seen_message_ids
+from utils.session import _sessions
 
-@pytest.fixture
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+
+if UVLOOP_AVAILABLE:
+    # Optional so a pytest-asyncio without this hook skips it instead of
+    # refusing to start the suite
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_asyncio_loop_factories(config, item):
+        """Run async tests on uvloop when it's installed, as the server does."""
+        return {"uvloop": uvloop.new_event_loop}
+
+
+@pytest.fixture(autouse=True)
+def clean_sessions():
+    """Clear the in-memory session store around every test."""
+    _sessions.clear()
+    yield
+    _sessions.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path, monkeypatch):
+    """Keep settings and conversion logs written by tests out of the real data/ dir."""
+    monkeypatch.setattr(storage, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(storage, "SETTINGS_FILE", tmp_path / "settings.json")
+    monkeypatch.setattr(storage, "CONVERSIONS_FILE", tmp_path / "conversions.json")
+
+
+@pytest.fixture(autouse=True)
+def isolated_blob_dir(tmp_path, monkeypatch):
+    """
+    Give each test its own session blob directory, so sweeps never touch the
+    blobs of another xdist worker or a locally running server.
+    """
+    blob_dir = str(tmp_path / "blobs")
+    monkeypatch.setattr(session_store, "BLOB_DIR", blob_dir)
+    return blob_dir
+
+
+@pytest.fixture(autouse=True)
+def clean_seen_message_ids():
+    """Forget webhook message IDs between tests, so fixtures can reuse them."""
+    _seen_message_ids.clear()
+    yield
+    _seen_message_ids.clear()
+
+
+@pytest.fixture(scope="session")
 def sample_image_bytes():
     """A small red 100x80 JPEG image."""
     img = Image.new("RGB", (100, 80), color=(255, 0, 0))
@@ -17,7 +74,7 @@ def sample_image_bytes():
     return buf.getvalue()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_png_bytes():
     """A small RGBA PNG with transparency."""
     img = Image.new("RGBA", (100, 80), color=(0, 128, 255, 180))
@@ -27,7 +84,7 @@ def sample_png_bytes():
     return buf.getvalue()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_pdf_bytes():
     """A 3-page PDF with text content."""
     buf = io.BytesIO()
@@ -46,7 +103,14 @@ def sample_pdf_bytes():
     return buf.getvalue()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def locked_pdf(sample_pdf_bytes):
+    """The 3-page sample PDF protected with the password "secret123"."""
+    from utils.pdf_tools import protect_pdf
+    return protect_pdf(sample_pdf_bytes, "secret123")
+
+
+@pytest.fixture(scope="session")
 def sample_1page_pdf():
     """A single-page PDF."""
     buf = io.BytesIO()
@@ -59,15 +123,25 @@ def sample_1page_pdf():
     return buf.getvalue()
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def signature_image_bytes():
     """A small signature-like image (black on white)."""
-    img = Image.new("RGBA", (200, 60), color=(255, 255, 255, 0))
+    pixels = np.full((60, 200, 4), (255, 255, 255, 0), dtype=np.uint8)
     # Draw a simple line across the image
-    for x in range(20, 180):
-        y = 30 + int(10 * ((x % 20) - 10) / 10)
-        img.putpixel((x, y), (0, 0, 0, 255))
+    x = np.arange(20, 180)
+    y = 30 + ((x % 20) - 10)
+    pixels[y, x] = (0, 0, 0, 255)
+    img = Image.fromarray(pixels)
     buf = io.BytesIO()
     img.save(buf, format="PNG")
     buf.seek(0)
     return buf.getvalue()
+
+
+@pytest.fixture(scope="session")
+def page_count():
+    """Count a PDF's pages from /Root/Pages/Count without walking the page tree."""
+    def _page_count(pdf_bytes: bytes) -> int:
+        with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
+            return int(pdf.Root.Pages.Count)
+    return _page_count
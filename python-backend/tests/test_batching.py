@@ -0,0 +1,32 @@
+"""Tests for the background queue batch collector."""
+
+import asyncio
+
+from utils.batching import collect_batch
+
+
+class TestCollectBatch:
+    async def test_stops_at_max_items(self):
+        queue = asyncio.Queue()
+        for i in range(5):
+            queue.put_nowait(i)
+        batch = []
+        await collect_batch(queue, batch, 3, 1.0)
+        assert batch == [0, 1, 2]
+
+    async def test_returns_partial_batch_after_max_wait(self):
+        queue = asyncio.Queue()
+        queue.put_nowait("a")
+        batch = []
+        await asyncio.wait_for(collect_batch(queue, batch, 10, 0.01), 1.0)
+        assert batch == ["a"]
+
+    async def test_cancel_keeps_items_already_taken(self):
+        queue = asyncio.Queue()
+        queue.put_nowait("a")
+        batch = []
+        collect = asyncio.create_task(collect_batch(queue, batch, 10, 1.0))
+        await asyncio.sleep(0.01)
+        collect.cancel()
+        await asyncio.gather(collect, return_exceptions=True)
+        assert batch == ["a"]
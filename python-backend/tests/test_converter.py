@@ -55,6 +55,37 @@ class TestMergeImagesToPdf:
         with pikepdf.open(io.BytesIO(result)) as pdf:
             assert len(pdf.pages) == 2
 
+    def test_parallel_merge_keeps_page_order(self):
+        from utils.converter import merge_images_to_pdf, PARALLEL_MERGE_MIN_PAGES
+        widths = [100 + 10 * i for i in range(PARALLEL_MERGE_MIN_PAGES + 1)]
+        images = []
+        for width in widths:
+            buf = io.BytesIO()
+            Image.new("RGB", (width, 80), (0, 0, 255)).save(buf, format="JPEG")
+            images.append((buf.getvalue(), "image/jpeg"))
+        result = merge_images_to_pdf(images)
+        with pikepdf.open(io.BytesIO(result)) as pdf:
+            page_widths = [round(float(page.mediabox[2])) for page in pdf.pages]
+        assert page_widths == sorted(page_widths) and len(set(page_widths)) == len(widths)
+
+    def test_merge_in_pool_worker_uses_few_threads(self, monkeypatch):
+        import utils.converter as converter
+
+        seen = []
+        real_executor = converter.ThreadPoolExecutor
+
+        def _executor(max_workers):
+            seen.append(max_workers)
+            return real_executor(max_workers=max_workers)
+
+        monkeypatch.setattr(converter, "ThreadPoolExecutor", _executor)
+        monkeypatch.setattr(converter.multiprocessing, "parent_process", lambda: object())
+        buf = io.BytesIO()
+        Image.new("RGB", (40, 40), (0, 0, 255)).save(buf, format="JPEG")
+        converter.merge_images_to_pdf([(buf.getvalue(), "image/jpeg")] * 6)
+
+        assert seen == [converter.POOL_MERGE_WORKERS]
+
     def test_merge_empty_raises(self):
         from utils.converter import merge_images_to_pdf
         with pytest.raises(ValueError, match="No images"):
@@ -74,6 +105,17 @@ class TestValidateImage:
         from utils.converter import validate_image
         assert validate_image(b"not an image") is False
 
+    def test_webp_recognised_by_signature(self):
+        from utils.converter import validate_image
+        assert validate_image(b"RIFF\x00\x00\x00\x00WEBPVP8 ") is True
+
+    def test_other_formats_fully_verified(self):
+        from utils.converter import validate_image
+        buf = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(buf, format="BMP")
+        assert validate_image(buf.getvalue()) is True
+        assert validate_image(buf.getvalue()[:20]) is False
+
 
 class TestProcessImage:
     def test_rgba_to_rgb(self):
@@ -85,6 +127,14 @@ class TestProcessImage:
         result = _process_image(buf.getvalue(), "image/png")
         assert result.mode == "RGB"
 
+    def test_transparency_composited_on_white(self):
+        from utils.converter import _process_image
+        img = Image.new("RGBA", (4, 4), (255, 0, 0, 128))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        result = _process_image(buf.getvalue(), "image/png")
+        assert result.getpixel((0, 0)) == (255, 127, 127)
+
     def test_large_image_resized(self):
         from utils.converter import _process_image, MAX_DIMENSION
         # Create a large image
@@ -101,3 +151,74 @@ class TestProcessImage:
         img.save(buf, format="JPEG")
         result = _process_image(buf.getvalue(), "image/jpeg", compress=True)
         assert max(result.size) <= COMPRESS_MAX_DIMENSION
+
+
+class TestRenderPage:
+    def test_plain_jpeg_embedded_unchanged(self, sample_image_bytes):
+        from utils.converter import _render_page
+        assert _render_page(sample_image_bytes, "image/jpeg") == sample_image_bytes
+
+    def test_jpeg_metadata_not_embedded(self):
+        from utils.converter import convert_image_to_pdf
+        img = Image.new("RGB", (100, 80), (255, 0, 0))
+        exif = Image.Exif()
+        exif[0x010F] = "SecretCam"  # Make
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", exif=exif, comment=b"taken at home")
+        for scan in (False, True):
+            result = convert_image_to_pdf(buf.getvalue(), "image/jpeg", scan=scan)
+            assert b"Exif" not in result
+            assert b"SecretCam" not in result
+            assert b"taken at home" not in result
+            with pikepdf.open(io.BytesIO(result)) as pdf:
+                assert len(pdf.pages) == 1
+
+    def test_rotated_jpeg_reencoded(self):
+        from utils.converter import _render_page
+        img = Image.new("RGB", (100, 80), (255, 0, 0))
+        exif = Image.Exif()
+        exif[274] = 6
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", exif=exif)
+        page = _render_page(buf.getvalue(), "image/jpeg")
+        assert page.startswith(b"\xff\xd8")
+        assert Image.open(io.BytesIO(page)).size == (80, 100)
+
+    def test_oversized_jpeg_not_embedded(self):
+        from utils.converter import _render_page, MAX_DIMENSION
+        # Exactly 2x the limit, so a 1/2-scale draft alone would fit
+        img = Image.new("RGB", (MAX_DIMENSION * 2, 64), (255, 0, 0))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG")
+        page = _render_page(buf.getvalue(), "image/jpeg", scan=False)
+        assert Image.open(io.BytesIO(page)).size == (MAX_DIMENSION, 32)
+
+    def test_png_stays_lossless(self, sample_png_bytes):
+        from utils.converter import _render_page
+        assert _render_page(sample_png_bytes, "image/png").startswith(b"\x89PNG")
+
+    def test_grayscale_jpeg_keeps_orientation(self):
+        from utils.converter import _process_image
+        img = Image.new("L", (100, 80), 128)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", exif=exif)
+        assert _process_image(buf.getvalue(), "image/jpeg").size == (80, 100)
+
+    def test_compress_reencodes_jpeg(self, sample_image_bytes):
+        from utils.converter import _render_page
+        assert _render_page(sample_image_bytes, "image/jpeg", compress=True) != sample_image_bytes
+
+    def test_scan_off_skips_scanner(self, sample_png_bytes):
+        from unittest.mock import patch
+        from utils.converter import merge_images_to_pdf
+        with patch("utils.converter.scan_document") as scan:
+            merge_images_to_pdf([(sample_png_bytes, "image/png")], scan=False)
+        scan.assert_not_called()
+
+    def test_downscale_falls_back_to_pillow(self, monkeypatch):
+        from utils.converter import _downscale
+        monkeypatch.setattr("utils.converter.OPENCV_AVAILABLE", False)
+        result = _downscale(Image.new("RGB", (400, 200)), (200, 100))
+        assert result.size == (200, 100)
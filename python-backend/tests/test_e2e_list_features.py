@@ -10,17 +10,12 @@ Every feature listed in FEATURE_SECTIONS and FEATURE_SECTIONS_2 is tested.
 """
 
 import io
+import importlib
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 
-from utils.session import _sessions, get_session, clear_session, update_session
-
-
-@pytest.fixture(autouse=True)
-def clean_sessions():
-    _sessions.clear()
-    yield
-    _sessions.clear()
+from utils.flow import handle_message
+from utils.session import get_session, clear_session, update_session
 
 
 MOCK_SETTINGS = {
@@ -68,30 +63,46 @@ def _text_message(text):
     return {"id": "msg5", "type": "text", "from": SENDER, "text": {"body": text}}
 
 
-@pytest.fixture
+# mock_whatsapp key → the utils.flow name it replaces
+WHATSAPP_FUNCTIONS = {
+    "send_text": "send_text_message",
+    "send_list": "send_list_message",
+    "send_button": "send_button_message",
+    "send_doc": "send_document_message",
+    "send_img": "send_image_message",
+    "send_typing": "send_typing_indicator",
+    "download": "download_media",
+    "upload": "upload_media",
+}
+
+
+@pytest.fixture(scope="class")
 def mock_whatsapp():
-    """Mock all WhatsApp API functions."""
-    with patch("utils.flow.send_text_message", new_callable=AsyncMock) as send_text, \
-         patch("utils.flow.send_list_message", new_callable=AsyncMock) as send_list, \
-         patch("utils.flow.send_button_message", new_callable=AsyncMock) as send_button, \
-         patch("utils.flow.send_document_message", new_callable=AsyncMock) as send_doc, \
-         patch("utils.flow.send_image_message", new_callable=AsyncMock) as send_img, \
-         patch("utils.flow.send_typing_indicator", new_callable=AsyncMock) as send_typing, \
-         patch("utils.flow.download_media", new_callable=AsyncMock) as download, \
-         patch("utils.flow.upload_media", new_callable=AsyncMock) as upload, \
-         patch("utils.flow.log_conversion") as log_conv:
-        upload.return_value = "uploaded_media_id"
-        yield {
-            "send_text": send_text,
-            "send_list": send_list,
-            "send_button": send_button,
-            "send_doc": send_doc,
-            "send_img": send_img,
-            "send_typing": send_typing,
-            "download": download,
-            "upload": upload,
-            "log_conversion": log_conv,
-        }
+    """Mock all WhatsApp API functions, once per test class."""
+    mocks = {key: AsyncMock() for key in WHATSAPP_FUNCTIONS}
+    mocks["log_conversion"] = MagicMock()
+    targets = {WHATSAPP_FUNCTIONS[key]: mocks[key] for key in WHATSAPP_FUNCTIONS}
+    with patch.multiple("utils.flow", log_conversion=mocks["log_conversion"], **targets):
+        yield mocks
+
+
+@pytest.fixture(autouse=True)
+def reset_whatsapp_mocks(mock_whatsapp):
+    """Give each test fresh call records and return values on the shared mocks."""
+    for mock in mock_whatsapp.values():
+        mock.reset_mock(return_value=True, side_effect=True)
+    mock_whatsapp["upload"].return_value = "uploaded_media_id"
+
+
+@pytest.fixture
+def fast_patch(monkeypatch):
+    """Replace module.attr with a MagicMock for the test; monkeypatch restores it."""
+    def _patch(target, **kwargs):
+        module_name, attr = target.rsplit(".", 1)
+        mock = MagicMock(**kwargs)
+        monkeypatch.setattr(importlib.import_module(module_name), attr, mock)
+        return mock
+    return _patch
 
 
 # ================================================================
@@ -102,19 +113,14 @@ def mock_whatsapp():
 class TestListConvert:
     """list_convert → Image to PDF: user taps → bot asks for image → user sends image → gets PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_convert"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "convert", f"Expected intent 'convert', got '{session.intent}'"
         mock_whatsapp["send_text"].assert_called_once()
         assert "image" in mock_whatsapp["send_text"].call_args[0][2].lower()
 
-    @pytest.mark.asyncio
     async def test_full_flow_image_to_pdf(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Image to PDF" from list
         await handle_message(_list_reply_message("list_convert"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
@@ -132,17 +138,12 @@ class TestListConvert:
 class TestListCompress:
     """list_compress → Compress PDF: user taps → bot asks for file → user sends image/PDF → gets compressed."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_compress"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "compress", f"Expected intent 'compress', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_compress_image(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Compress PDF"
         await handle_message(_list_reply_message("list_compress"), SENDER, MOCK_SETTINGS)
 
@@ -153,13 +154,9 @@ class TestListCompress:
         mock_whatsapp["upload"].assert_called_once()
         mock_whatsapp["send_doc"].assert_called_once()
         # Caption should mention compress
-        call_kwargs = mock_whatsapp["send_doc"].call_args
-        assert "ompress" in str(call_kwargs)
+        assert "ompress" in mock_whatsapp["send_doc"].call_args.kwargs["caption"]
 
-    @pytest.mark.asyncio
     async def test_full_flow_compress_pdf(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Compress PDF"
         await handle_message(_list_reply_message("list_compress"), SENDER, MOCK_SETTINGS)
 
@@ -174,18 +171,13 @@ class TestListCompress:
 class TestListMerge:
     """list_merge → Merge Files: user taps → bot starts collecting → user sends files → types done."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_collecting_state(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_merge"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.state == "collecting_images"
         assert session.intent == "merge"
 
-    @pytest.mark.asyncio
     async def test_full_flow_merge_images(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Merge Files"
         await handle_message(_list_reply_message("list_merge"), SENDER, MOCK_SETTINGS)
 
@@ -208,26 +200,21 @@ class TestListMerge:
 class TestListEnhance:
     """list_enhance → Enhance Image: user taps → bot asks for image → user sends image → gets enhanced."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_enhance"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "enhance", f"Expected intent 'enhance', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_enhance(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_enhance(self, mock_whatsapp, sample_image_bytes, fast_patch):
         # Step 1: User taps "Enhance Image"
         await handle_message(_list_reply_message("list_enhance"), SENDER, MOCK_SETTINGS)
         assert get_session(SENDER).intent == "enhance"
 
         # Step 2: User sends an image
         mock_whatsapp["download"].return_value = sample_image_bytes
-        with patch("utils.image_tools.enhance_document", return_value=sample_image_bytes) as mock_enhance:
-            await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
-            mock_enhance.assert_called_once()
+        mock_enhance = fast_patch("utils.image_tools.enhance_document", return_value=sample_image_bytes)
+        await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
+        mock_enhance.assert_called_once()
 
         mock_whatsapp["upload"].assert_called_once()
         mock_whatsapp["send_img"].assert_called_once()
@@ -236,26 +223,21 @@ class TestListEnhance:
 class TestListRemoveBg:
     """list_remove_bg → Remove Background: user taps → bot asks for image → user sends image → gets result."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_remove_bg"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "remove_bg", f"Expected intent 'remove_bg', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_remove_bg(self, mock_whatsapp, sample_png_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_remove_bg(self, mock_whatsapp, sample_png_bytes, fast_patch):
         # Step 1: User taps "Remove Background"
         await handle_message(_list_reply_message("list_remove_bg"), SENDER, MOCK_SETTINGS)
         assert get_session(SENDER).intent == "remove_bg"
 
         # Step 2: User sends image
         mock_whatsapp["download"].return_value = sample_png_bytes
-        with patch("utils.image_tools.remove_background", return_value=sample_png_bytes) as mock_rm_bg:
-            await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
-            mock_rm_bg.assert_called_once()
+        mock_rm_bg = fast_patch("utils.image_tools.remove_background", return_value=sample_png_bytes)
+        await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
+        mock_rm_bg.assert_called_once()
 
         mock_whatsapp["upload"].assert_called_once()
         mock_whatsapp["send_img"].assert_called_once()
@@ -269,17 +251,12 @@ class TestListRemoveBg:
 class TestListSplit:
     """list_split → Split PDF: user taps → sends PDF → enters page spec → gets split PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_split"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "split", f"Expected intent 'split', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_split(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Split PDF"
         await handle_message(_list_reply_message("list_split"), SENDER, MOCK_SETTINGS)
 
@@ -297,25 +274,20 @@ class TestListSplit:
         # Verify result sent
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "split" in str(mock_whatsapp["send_doc"].call_args).lower() or \
-               "extract" in str(mock_whatsapp["send_doc"].call_args).lower()
+        caption = mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
+        assert "split" in caption or "extract" in caption
 
 
 class TestListRotate:
     """list_rotate → Rotate PDF: user taps → selects angle → sends PDF → gets rotated PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sends_angle_buttons(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_rotate"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "rotate", f"Expected intent 'rotate', got '{session.intent}'"
         mock_whatsapp["send_button"].assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_full_flow_rotate(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Rotate PDF"
         await handle_message(_list_reply_message("list_rotate"), SENDER, MOCK_SETTINGS)
 
@@ -335,17 +307,12 @@ class TestListRotate:
 class TestListReorder:
     """list_reorder → Reorder Pages: user taps → sends PDF → enters order → gets reordered PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_reorder"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "reorder", f"Expected intent 'reorder', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_reorder(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Reorder Pages"
         await handle_message(_list_reply_message("list_reorder"), SENDER, MOCK_SETTINGS)
 
@@ -366,17 +333,12 @@ class TestListReorder:
 class TestListLock:
     """list_lock → Lock PDF: user taps → sends PDF → enters password → gets locked PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_lock"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "lock_pdf", f"Expected intent 'lock_pdf', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_lock(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Lock PDF"
         await handle_message(_list_reply_message("list_lock"), SENDER, MOCK_SETTINGS)
 
@@ -392,27 +354,18 @@ class TestListLock:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "protect" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "protect" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 class TestListUnlock:
     """list_unlock → Unlock PDF: user taps → sends locked PDF → enters password → gets unlocked PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_unlock"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "unlock_pdf", f"Expected intent 'unlock_pdf', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_unlock(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-        from utils.pdf_tools import protect_pdf
-
-        # Create a locked PDF for testing
-        locked_pdf = protect_pdf(sample_pdf_bytes, "secret123")
-
+    async def test_full_flow_unlock(self, mock_whatsapp, locked_pdf):
         # Step 1: User taps "Unlock PDF"
         await handle_message(_list_reply_message("list_unlock"), SENDER, MOCK_SETTINGS)
 
@@ -428,7 +381,7 @@ class TestListUnlock:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "unlock" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "unlock" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 # ================================================================
@@ -439,59 +392,46 @@ class TestListUnlock:
 class TestListOcr:
     """list_ocr → Extract Text (OCR): user taps → sends image/PDF → gets extracted text."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_ocr"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "ocr", f"Expected intent 'ocr', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_ocr_image(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_ocr_image(self, mock_whatsapp, sample_image_bytes, fast_patch):
         # Step 1: User taps "Extract Text (OCR)"
         await handle_message(_list_reply_message("list_ocr"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends image
         mock_whatsapp["download"].return_value = sample_image_bytes
-        with patch("utils.ocr.extract_text_from_image", return_value="Hello World") as mock_ocr:
-            await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
-            mock_ocr.assert_called_once()
+        mock_ocr = fast_patch("utils.ocr.extract_text_from_image", return_value="Hello World")
+        await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
+        mock_ocr.assert_called_once()
 
         # Bot should send text back
         text_calls = mock_whatsapp["send_text"].call_args_list
-        found_text = any("Hello World" in str(c) for c in text_calls)
+        found_text = any("Hello World" in c.args[2] for c in text_calls)
         assert found_text, "Extracted text should be sent back to user"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_ocr_pdf(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_ocr_pdf(self, mock_whatsapp, sample_pdf_bytes, fast_patch):
         # Step 1: User taps "Extract Text (OCR)"
         await handle_message(_list_reply_message("list_ocr"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends PDF
         mock_whatsapp["download"].return_value = sample_pdf_bytes
-        with patch("utils.ocr.extract_text_from_pdf", return_value="PDF content here") as mock_ocr:
-            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-            mock_ocr.assert_called_once()
+        mock_ocr = fast_patch("utils.ocr.extract_text_from_pdf", return_value="PDF content here")
+        await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+        mock_ocr.assert_called_once()
 
 
 class TestListPageNumbers:
     """list_page_numbers → Page Numbers: user taps → sends PDF → gets numbered PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_page_numbers"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "page_numbers", f"Expected intent 'page_numbers', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_page_numbers(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Page Numbers"
         await handle_message(_list_reply_message("list_page_numbers"), SENDER, MOCK_SETTINGS)
 
@@ -501,23 +441,18 @@ class TestListPageNumbers:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "number" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "number" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 class TestListWatermark:
     """list_watermark → Watermark: user taps → sends PDF → enters text → gets watermarked PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_watermark"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "watermark", f"Expected intent 'watermark', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_watermark(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Watermark"
         await handle_message(_list_reply_message("list_watermark"), SENDER, MOCK_SETTINGS)
 
@@ -533,23 +468,18 @@ class TestListWatermark:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "watermark" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "watermark" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 class TestListSign:
     """list_sign → Sign PDF: user taps → sends PDF → sends signature image → gets signed PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_sign"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "sign_pdf", f"Expected intent 'sign_pdf', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_sign(self, mock_whatsapp, sample_pdf_bytes, signature_image_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Sign PDF"
         await handle_message(_list_reply_message("list_sign"), SENDER, MOCK_SETTINGS)
 
@@ -566,23 +496,18 @@ class TestListSign:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "sign" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "sign" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 class TestListArchive:
     """list_archive → Archive PDF: user taps → sends PDF → gets archived PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_archive"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "pdf_archive", f"Expected intent 'pdf_archive', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_full_flow_archive(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Step 1: User taps "Archive PDF"
         await handle_message(_list_reply_message("list_archive"), SENDER, MOCK_SETTINGS)
 
@@ -592,7 +517,7 @@ class TestListArchive:
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert "archiv" in str(mock_whatsapp["send_doc"].call_args).lower()
+        assert "archiv" in mock_whatsapp["send_doc"].call_args.kwargs["caption"].lower()
 
 
 # ================================================================
@@ -603,56 +528,45 @@ class TestListArchive:
 class TestListPdfToWord:
     """list_pdf_to_word → PDF to Word: user taps → sends PDF → gets .docx."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_pdf_to_word"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "pdf_to_word", f"Expected intent 'pdf_to_word', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_pdf_to_word(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_pdf_to_word(self, mock_whatsapp, sample_pdf_bytes, fast_patch):
         # Step 1: User taps "PDF to Word"
         await handle_message(_list_reply_message("list_pdf_to_word"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends PDF
         mock_whatsapp["download"].return_value = sample_pdf_bytes
-        with patch("utils.pdf_converter.pdf_to_word", return_value=b"fake_docx_data") as mock_conv:
-            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-            mock_conv.assert_called_once()
+        mock_conv = fast_patch("utils.pdf_converter.pdf_to_word", return_value=b"fake_docx_data")
+        await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+        mock_conv.assert_called_once()
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
         # Verify output filename has .docx
-        call_kwargs = mock_whatsapp["send_doc"].call_args
-        assert ".docx" in str(call_kwargs)
+        assert mock_whatsapp["send_doc"].call_args.kwargs["filename"].endswith(".docx")
 
 
 class TestListPdfToImage:
     """list_pdf_to_image → PDF to Images: user taps → sends PDF → gets images."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_pdf_to_image"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "pdf_to_image", f"Expected intent 'pdf_to_image', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_pdf_to_image(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_pdf_to_image(self, mock_whatsapp, sample_pdf_bytes, fast_patch):
         # Step 1: User taps "PDF to Images"
         await handle_message(_list_reply_message("list_pdf_to_image"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends PDF
         mock_whatsapp["download"].return_value = sample_pdf_bytes
         fake_images = [(b"img1", "page_1.jpg"), (b"img2", "page_2.jpg")]
-        with patch("utils.pdf_converter.pdf_to_images", return_value=fake_images) as mock_conv:
-            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-            mock_conv.assert_called_once()
+        mock_conv = fast_patch("utils.pdf_converter.pdf_to_images", return_value=fake_images)
+        await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+        mock_conv.assert_called_once()
 
         # Should have sent 2 images
         assert mock_whatsapp["send_img"].call_count == 2
@@ -661,87 +575,72 @@ class TestListPdfToImage:
 class TestListPdfToPpt:
     """list_pdf_to_ppt → PDF to PPT: user taps → sends PDF → gets .pptx."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_pdf_to_ppt"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "pdf_to_ppt", f"Expected intent 'pdf_to_ppt', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_pdf_to_ppt(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_pdf_to_ppt(self, mock_whatsapp, sample_pdf_bytes, fast_patch):
         # Step 1: User taps "PDF to PPT"
         await handle_message(_list_reply_message("list_pdf_to_ppt"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends PDF
         mock_whatsapp["download"].return_value = sample_pdf_bytes
-        with patch("utils.pdf_converter.pdf_to_ppt", return_value=b"fake_pptx_data") as mock_conv:
-            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-            mock_conv.assert_called_once()
+        mock_conv = fast_patch("utils.pdf_converter.pdf_to_ppt", return_value=b"fake_pptx_data")
+        await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+        mock_conv.assert_called_once()
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert ".pptx" in str(mock_whatsapp["send_doc"].call_args)
+        assert mock_whatsapp["send_doc"].call_args.kwargs["filename"].endswith(".pptx")
 
 
 class TestListPdfToExcel:
     """list_pdf_to_excel → PDF to Excel: user taps → sends PDF → gets .xlsx."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_pdf_to_excel"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "pdf_to_excel", f"Expected intent 'pdf_to_excel', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_pdf_to_excel(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
+    async def test_full_flow_pdf_to_excel(self, mock_whatsapp, sample_pdf_bytes, fast_patch):
         # Step 1: User taps "PDF to Excel"
         await handle_message(_list_reply_message("list_pdf_to_excel"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends PDF
         mock_whatsapp["download"].return_value = sample_pdf_bytes
-        with patch("utils.pdf_converter.pdf_to_excel", return_value=b"fake_xlsx_data") as mock_conv:
-            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-            mock_conv.assert_called_once()
+        mock_conv = fast_patch("utils.pdf_converter.pdf_to_excel", return_value=b"fake_xlsx_data")
+        await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+        mock_conv.assert_called_once()
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
-        assert ".xlsx" in str(mock_whatsapp["send_doc"].call_args)
+        assert mock_whatsapp["send_doc"].call_args.kwargs["filename"].endswith(".xlsx")
 
 
 class TestListWordToPdf:
     """list_word_to_pdf → Office to PDF: user taps → sends Word/Excel/PPT → gets PDF."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_word_to_pdf"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "word_to_pdf", f"Expected intent 'word_to_pdf', got '{session.intent}'"
 
-    @pytest.mark.asyncio
-    async def test_full_flow_word_to_pdf(self, mock_whatsapp):
-        from utils.flow import handle_message
-
+    async def test_full_flow_word_to_pdf(self, mock_whatsapp, fast_patch):
         # Step 1: User taps "Office to PDF"
         await handle_message(_list_reply_message("list_word_to_pdf"), SENDER, MOCK_SETTINGS)
 
         # Step 2: User sends a Word document
         mock_whatsapp["download"].return_value = b"fake_docx_content"
-        with patch("utils.pdf_converter.office_to_pdf", return_value=b"fake_pdf_data") as mock_conv:
-            await handle_message(
-                _document_message(
-                    mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    filename="report.docx",
-                ),
-                SENDER, MOCK_SETTINGS,
-            )
-            mock_conv.assert_called_once()
+        mock_conv = fast_patch("utils.pdf_converter.office_to_pdf", return_value=b"fake_pdf_data")
+        await handle_message(
+            _document_message(
+                mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                filename="report.docx",
+            ),
+            SENDER, MOCK_SETTINGS,
+        )
+        mock_conv.assert_called_once()
 
         mock_whatsapp["upload"].assert_called()
         mock_whatsapp["send_doc"].assert_called_once()
@@ -756,9 +655,7 @@ class TestListWordToPdf:
 class TestListExcelToPdf:
     """list_excel_to_pdf is in the intent map but not in the menu. Test it anyway."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_excel_to_pdf"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "excel_to_pdf", f"Expected intent 'excel_to_pdf', got '{session.intent}'"
@@ -767,9 +664,7 @@ class TestListExcelToPdf:
 class TestListPptToPdf:
     """list_ppt_to_pdf is in the intent map but not in the menu. Test it anyway."""
 
-    @pytest.mark.asyncio
     async def test_list_reply_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_ppt_to_pdf"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "ppt_to_pdf", f"Expected intent 'ppt_to_pdf', got '{session.intent}'"
@@ -783,31 +678,25 @@ class TestListPptToPdf:
 class TestCancelDuringFeatureFlow:
     """Verify cancel resets state during any in-progress feature."""
 
-    @pytest.mark.asyncio
     async def test_cancel_during_split_awaiting_input(self, mock_whatsapp, sample_pdf_bytes):
-        from utils.flow import handle_message
-
         # Set up split flow, send PDF, then cancel
         await handle_message(_list_reply_message("list_split"), SENDER, MOCK_SETTINGS)
         mock_whatsapp["download"].return_value = sample_pdf_bytes
         await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
-        assert get_session(SENDER).state == "awaiting_input"
+        session = get_session(SENDER)
+        assert session.state == "awaiting_input"
 
         await handle_message(_text_message("cancel"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
         assert session.state == "idle"
         assert session.intent is None
 
-    @pytest.mark.asyncio
     async def test_cancel_during_merge_collecting(self, mock_whatsapp):
-        from utils.flow import handle_message
-
         await handle_message(_list_reply_message("list_merge"), SENDER, MOCK_SETTINGS)
         await handle_message(_image_message("img_1"), SENDER, MOCK_SETTINGS)
-        assert get_session(SENDER).image_count == 1
+        session = get_session(SENDER)
+        assert session.image_count == 1
 
         await handle_message(_text_message("cancel"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
         assert session.state == "idle"
         assert session.intent is None
 
@@ -846,42 +735,15 @@ class TestAllListIdsSetCorrectIntent:
         "list_ppt_to_pdf": "ppt_to_pdf",
     }
 
-    @pytest.mark.asyncio
-    @pytest.mark.parametrize("list_id,expected_intent", [
-        ("list_convert", "convert"),
-        ("list_compress", "compress"),
-        ("list_enhance", "enhance"),
-        ("list_remove_bg", "remove_bg"),
-        ("list_split", "split"),
-        ("list_rotate", "rotate"),
-        ("list_reorder", "reorder"),
-        ("list_lock", "lock_pdf"),
-        ("list_unlock", "unlock_pdf"),
-        ("list_ocr", "ocr"),
-        ("list_page_numbers", "page_numbers"),
-        ("list_watermark", "watermark"),
-        ("list_sign", "sign_pdf"),
-        ("list_archive", "pdf_archive"),
-        ("list_pdf_to_word", "pdf_to_word"),
-        ("list_pdf_to_image", "pdf_to_image"),
-        ("list_pdf_to_ppt", "pdf_to_ppt"),
-        ("list_pdf_to_excel", "pdf_to_excel"),
-        ("list_word_to_pdf", "word_to_pdf"),
-        ("list_excel_to_pdf", "excel_to_pdf"),
-        ("list_ppt_to_pdf", "ppt_to_pdf"),
-    ])
+    @pytest.mark.parametrize("list_id,expected_intent", sorted(EXPECTED_INTENTS.items()))
     async def test_list_id_sets_correct_intent(self, mock_whatsapp, list_id, expected_intent):
-        from utils.flow import handle_message
-        _sessions.clear()  # Ensure clean state for each parametrized run
         await handle_message(_list_reply_message(list_id), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == expected_intent, \
             f"List ID '{list_id}': expected intent '{expected_intent}', got '{session.intent}'"
 
-    @pytest.mark.asyncio
     async def test_list_merge_sets_collecting_state(self, mock_whatsapp):
         """Merge is special — it sets state to 'collecting_images' not just intent."""
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_merge"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.state == "collecting_images"
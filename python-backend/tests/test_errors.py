@@ -29,9 +29,20 @@ class TestErrorMessages:
         assert "5 MB" in msg
 
     def test_all_keys_have_en(self):
-        for key in ErrorMessages.MESSAGES:
-            assert "en" in ErrorMessages.MESSAGES[key], f"Missing 'en' for key: {key}"
+        missing = [key for key, langs in ErrorMessages.MESSAGES.items() if "en" not in langs]
+        assert not missing, f"Missing 'en' for keys: {missing}"
 
     def test_all_keys_have_hi(self):
-        for key in ErrorMessages.MESSAGES:
-            assert "hi" in ErrorMessages.MESSAGES[key], f"Missing 'hi' for key: {key}"
+        missing = [key for key, langs in ErrorMessages.MESSAGES.items() if "hi" not in langs]
+        assert not missing, f"Missing 'hi' for keys: {missing}"
+
+    def test_missing_placeholder_returns_template(self):
+        msg = ErrorMessages.get("file_too_large", "en")
+        assert "{limit}" in msg
+
+    def test_unknown_language_falls_back_to_english(self):
+        assert ErrorMessages.get("timeout", "fr") == ErrorMessages.get("timeout", "en")
+
+    def test_unhashable_substitution_still_formats(self):
+        msg = ErrorMessages.get("unsupported_format", "en", expected=["PDF"])
+        assert "['PDF']" in msg
@@ -1,17 +1,19 @@
 """Tests for the conversation flow controller.
 Mocks all WhatsApp API calls and tests the routing logic."""
 
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 
-from utils.session import _sessions, get_session, clear_session
-
-
-@pytest.fixture(autouse=True)
-def clean_sessions():
-    _sessions.clear()
-    yield
-    _sessions.clear()
+import utils.flow as flow
+from utils.flow import (
+    handle_message, apply_intent, handle_messages, parse_message, enqueue_messages,
+    run_message_workers, _download_all, _file_timestamp, _file_time, _new_conversion_id,
+    _sender_locks, _seen_message_ids, INTENT_HANDLERS, MESSAGE_HANDLERS,
+    MESSAGE_DEDUP_TTL, _CONVERSION_ID_PREFIX,
+)
+from utils.intent import Intent
+from utils.session import get_session, clear_session
 
 
 MOCK_SETTINGS = {
@@ -54,57 +56,47 @@ def _button_reply_message(button_id):
     }
 
 
+# mock_whatsapp key → the utils.flow name it replaces
+WHATSAPP_FUNCTIONS = {
+    "send_text": "send_text_message",
+    "send_list": "send_list_message",
+    "send_button": "send_button_message",
+    "send_doc": "send_document_message",
+    "send_img": "send_image_message",
+    "send_typing": "send_typing_indicator",
+    "download": "download_media",
+    "upload": "upload_media",
+}
+
+
 @pytest.fixture
 def mock_whatsapp():
     """Mock all WhatsApp API functions."""
-    with patch("utils.flow.send_text_message", new_callable=AsyncMock) as send_text, \
-         patch("utils.flow.send_list_message", new_callable=AsyncMock) as send_list, \
-         patch("utils.flow.send_button_message", new_callable=AsyncMock) as send_button, \
-         patch("utils.flow.send_document_message", new_callable=AsyncMock) as send_doc, \
-         patch("utils.flow.send_image_message", new_callable=AsyncMock) as send_img, \
-         patch("utils.flow.send_typing_indicator", new_callable=AsyncMock) as send_typing, \
-         patch("utils.flow.download_media", new_callable=AsyncMock) as download, \
-         patch("utils.flow.upload_media", new_callable=AsyncMock) as upload:
-        upload.return_value = "uploaded_media_id"
-        yield {
-            "send_text": send_text,
-            "send_list": send_list,
-            "send_button": send_button,
-            "send_doc": send_doc,
-            "send_img": send_img,
-            "send_typing": send_typing,
-            "download": download,
-            "upload": upload,
-        }
+    mocks = {key: AsyncMock() for key in WHATSAPP_FUNCTIONS}
+    mocks["upload"].return_value = "uploaded_media_id"
+    with patch.multiple("utils.flow", **{WHATSAPP_FUNCTIONS[key]: mock for key, mock in mocks.items()}):
+        yield mocks
 
 
 class TestGreeting:
-    @pytest.mark.asyncio
     async def test_hi_sends_feature_menu(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("hi"), SENDER, MOCK_SETTINGS)
         mock_whatsapp["send_list"].assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_hello_sends_feature_menu(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("hello"), SENDER, MOCK_SETTINGS)
         mock_whatsapp["send_list"].assert_called_once()
 
 
 class TestHelp:
-    @pytest.mark.asyncio
     async def test_help_sends_text_and_list(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("help"), SENDER, MOCK_SETTINGS)
         assert mock_whatsapp["send_text"].call_count >= 1
         assert mock_whatsapp["send_list"].call_count >= 1
 
 
 class TestCancel:
-    @pytest.mark.asyncio
     async def test_cancel_clears_session(self, mock_whatsapp):
-        from utils.flow import handle_message
         from utils.session import update_session
         update_session(SENDER, state="collecting_images", intent="merge")
         await handle_message(_text_message("cancel"), SENDER, MOCK_SETTINGS)
@@ -114,9 +106,7 @@ class TestCancel:
 
 
 class TestConvert:
-    @pytest.mark.asyncio
     async def test_convert_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("convert"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "convert"
@@ -124,190 +114,452 @@ class TestConvert:
 
 
 class TestCompress:
-    @pytest.mark.asyncio
-    async def test_compress_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("compress"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_compress_sets_intent(self):
+        session = apply_intent(Intent.COMPRESS, SENDER)
         assert session.intent == "compress"
 
 
 class TestMerge:
-    @pytest.mark.asyncio
     async def test_merge_sets_collecting_state(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("merge"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.state == "collecting_images"
         assert session.intent == "merge"
 
-    @pytest.mark.asyncio
     async def test_status_during_merge(self, mock_whatsapp):
-        from utils.flow import handle_message
         from utils.session import update_session, add_image_to_session
         update_session(SENDER, state="collecting_images", intent="merge")
         add_image_to_session(SENDER, "m1", "image/jpeg")
         await handle_message(_text_message("status"), SENDER, MOCK_SETTINGS)
-        call_args = mock_whatsapp["send_text"].call_args[0]
-        assert "1" in call_args[2]  # Should mention count
+        assert "1" in mock_whatsapp["send_text"].call_args.args[2]  # Should mention count
 
 
 class TestRotate:
-    @pytest.mark.asyncio
     async def test_rotate_sends_buttons(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("rotate"), SENDER, MOCK_SETTINGS)
         mock_whatsapp["send_button"].assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_rotate_button_sets_angle(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_button_reply_message("btn_rotate_90"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.rotation_angle == 90
 
 
 class TestSplit:
-    @pytest.mark.asyncio
-    async def test_split_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("split"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_split_sets_intent(self):
+        session = apply_intent(Intent.SPLIT, SENDER)
         assert session.intent == "split"
 
 
 class TestLockUnlock:
-    @pytest.mark.asyncio
-    async def test_lock_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("lock"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_lock_sets_intent(self):
+        session = apply_intent(Intent.LOCK_PDF, SENDER)
         assert session.intent == "lock_pdf"
 
-    @pytest.mark.asyncio
-    async def test_unlock_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("unlock"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_unlock_sets_intent(self):
+        session = apply_intent(Intent.UNLOCK_PDF, SENDER)
         assert session.intent == "unlock_pdf"
 
 
 class TestOcr:
-    @pytest.mark.asyncio
-    async def test_ocr_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("ocr"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_ocr_sets_intent(self):
+        session = apply_intent(Intent.OCR, SENDER)
         assert session.intent == "ocr"
 
 
 class TestWatermark:
-    @pytest.mark.asyncio
-    async def test_watermark_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("watermark"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_watermark_sets_intent(self):
+        session = apply_intent(Intent.WATERMARK, SENDER)
         assert session.intent == "watermark"
 
 
 class TestSign:
-    @pytest.mark.asyncio
-    async def test_sign_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("sign"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_sign_sets_intent(self):
+        session = apply_intent(Intent.SIGN_PDF, SENDER)
         assert session.intent == "sign_pdf"
 
 
 class TestPdfConversions:
-    @pytest.mark.asyncio
-    async def test_pdf_to_word_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("pdf to word"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_pdf_to_word_sets_intent(self):
+        session = apply_intent(Intent.PDF_TO_WORD, SENDER)
         assert session.intent == "pdf_to_word"
 
-    @pytest.mark.asyncio
-    async def test_pdf_to_image_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("pdf to image"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_pdf_to_image_sets_intent(self):
+        session = apply_intent(Intent.PDF_TO_IMAGE, SENDER)
         assert session.intent == "pdf_to_image"
 
-    @pytest.mark.asyncio
-    async def test_pdf_to_ppt_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("pdf to ppt"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_pdf_to_ppt_sets_intent(self):
+        session = apply_intent(Intent.PDF_TO_PPT, SENDER)
         assert session.intent == "pdf_to_ppt"
 
-    @pytest.mark.asyncio
-    async def test_pdf_to_excel_sets_intent(self, mock_whatsapp):
-        from utils.flow import handle_message
-        await handle_message(_text_message("pdf to excel"), SENDER, MOCK_SETTINGS)
-        session = get_session(SENDER)
+    def test_pdf_to_excel_sets_intent(self):
+        session = apply_intent(Intent.PDF_TO_EXCEL, SENDER)
         assert session.intent == "pdf_to_excel"
 
 
 class TestListReply:
-    @pytest.mark.asyncio
     async def test_list_convert(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_convert"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "convert"
 
-    @pytest.mark.asyncio
     async def test_list_split(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_list_reply_message("list_split"), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.intent == "split"
 
 
 class TestFallback:
-    @pytest.mark.asyncio
     async def test_unknown_message(self, mock_whatsapp):
-        from utils.flow import handle_message
         await handle_message(_text_message("asdfghjkl"), SENDER, MOCK_SETTINGS)
-        call_args = mock_whatsapp["send_text"].call_args[0]
-        assert "understand" in call_args[2].lower() or "help" in call_args[2].lower()
+        send_text = mock_whatsapp["send_text"]
+        assert send_text.call_count == 1
+        reply = send_text.call_args.args[2].lower()
+        assert "understand" in reply or "help" in reply
 
-    @pytest.mark.asyncio
     async def test_unsupported_type(self, mock_whatsapp):
-        from utils.flow import handle_message
         msg = {"id": "msg_x", "type": "sticker", "from": SENDER}
         await handle_message(msg, SENDER, MOCK_SETTINGS)
         mock_whatsapp["send_text"].assert_called_once()
 
+    async def test_reaction_is_ignored(self, mock_whatsapp):
+        msg = {"id": "msg_r", "type": "reaction", "from": SENDER,
+               "reaction": {"message_id": "msg1", "emoji": "👍"}}
+        await handle_message(msg, SENDER, MOCK_SETTINGS)
+        mock_whatsapp["send_typing"].assert_not_called()
+        mock_whatsapp["send_text"].assert_not_called()
+
 
 class TestImageHandling:
-    @pytest.mark.asyncio
     async def test_image_default_converts(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
         mock_whatsapp["download"].return_value = sample_image_bytes
         await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
         mock_whatsapp["upload"].assert_called_once()
         mock_whatsapp["send_doc"].assert_called_once()
 
-    @pytest.mark.asyncio
     async def test_image_with_compress_caption(self, mock_whatsapp, sample_image_bytes):
-        from utils.flow import handle_message
         mock_whatsapp["download"].return_value = sample_image_bytes
         await handle_message(_image_message(caption="compress"), SENDER, MOCK_SETTINGS)
-        mock_whatsapp["send_doc"].assert_called_once()
+        send_doc = mock_whatsapp["send_doc"]
+        assert send_doc.call_count == 1
         # Caption in the sent doc should mention "compress"
-        call_kwargs = mock_whatsapp["send_doc"].call_args
-        assert "ompress" in str(call_kwargs)
+        assert "ompress" in send_doc.call_args.kwargs["caption"]
 
-    @pytest.mark.asyncio
     async def test_image_during_merge(self, mock_whatsapp):
-        from utils.flow import handle_message
         from utils.session import update_session
         update_session(SENDER, state="collecting_images", intent="merge")
         await handle_message(_image_message(), SENDER, MOCK_SETTINGS)
         session = get_session(SENDER)
         assert session.image_count == 1
         # Should send "added" confirmation
-        call_args = mock_whatsapp["send_text"].call_args[0]
-        assert "added" in call_args[2].lower() or "1" in call_args[2]
+        reply = mock_whatsapp["send_text"].call_args.args[2]
+        assert "added" in reply.lower() or "1" in reply
+
+
+class TestParseMessage:
+    def test_parses_list_reply(self):
+        msg = parse_message(_list_reply_message("list_split"))
+        assert msg.kind == "list_reply"
+        assert msg.reply_id == "list_split"
+        assert msg.message_id == "msg4"
+
+    def test_parses_image_caption(self):
+        msg = parse_message(_image_message(media_id="img_9", caption="merge"))
+        assert msg.kind == "image"
+        assert msg.media_id == "img_9"
+        assert msg.mime_type == "image/jpeg"
+        assert msg.text == "merge"
+
+    def test_document_defaults(self):
+        msg = parse_message({"id": "m", "type": "document", "document": {"id": "d1"}})
+        assert msg.filename == "document"
+        assert msg.mime_type == ""
+
+    def test_unknown_type_keeps_kind(self):
+        msg = parse_message({"id": "m", "type": "sticker"})
+        assert msg.kind == "sticker"
+
+
+class TestMergeDownloads:
+    async def test_concurrent_downloads_keep_order(self, mock_whatsapp):
+        from utils.session import add_image_to_session, update_session
+
+        update_session(SENDER, state="collecting_images", intent="merge")
+        for media_id in ("a", "b", "c"):
+            add_image_to_session(SENDER, media_id, "image/jpeg")
+
+        delays = {"a": 0.03, "b": 0.02, "c": 0.01}
+
+        async def _download(settings, media_id, max_bytes=None):
+            await asyncio.sleep(delays[media_id])
+            return media_id.encode()
+
+        mock_whatsapp["download"].side_effect = _download
+        with patch("utils.flow.merge_images_to_pdf", return_value=b"%PDF") as merge:
+            await handle_message(_text_message("done"), SENDER, MOCK_SETTINGS)
+
+        images = merge.call_args.args[0]
+        assert [data for data, _ in images] == [b"a", b"b", b"c"]
+        mock_whatsapp["send_doc"].assert_called_once()
+
+    async def test_failed_download_cancels_the_rest(self, mock_whatsapp):
+        finished = []
+
+        async def _download(settings, media_id, max_bytes=None):
+            if media_id == "bad":
+                raise ValueError("gone")
+            await asyncio.sleep(0.05)
+            finished.append(media_id)
+            return b""
+
+        mock_whatsapp["download"].side_effect = _download
+        with pytest.raises(ValueError):
+            await _download_all(MOCK_SETTINGS, ["a", "bad", "c"])
+        await asyncio.sleep(0.1)
+        assert finished == []
+
+    async def test_merge_stops_downloading_once_over_budget(self, mock_whatsapp):
+        from utils.session import add_image_to_session, update_session
+
+        started = []
+
+        async def _download(settings, media_id, max_bytes=None):
+            started.append(media_id)
+            if media_id == "big":
+                return b"x" * 11
+            await asyncio.sleep(0.05)
+            return b"x"
+
+        mock_whatsapp["download"].side_effect = _download
+        update_session(SENDER, state="collecting_images", intent="merge")
+        for media_id in ("big", "a", "b"):
+            add_image_to_session(SENDER, media_id, "image/jpeg")
+        with patch("utils.flow.MAX_MERGE_BYTES", 10), \
+                patch("utils.flow.MEDIA_DOWNLOAD_CONCURRENCY", 1):
+            await handle_message(_text_message("done"), SENDER, MOCK_SETTINGS)
+
+        assert started == ["big"]
+        assert "50 MB" in mock_whatsapp["send_text"].call_args.args[2]
+        mock_whatsapp["upload"].assert_not_called()
+
+
+class TestPdfToImagePages:
+    async def test_pages_sent_in_order(self, mock_whatsapp, sample_pdf_bytes):
+        from utils.session import update_session
+
+        def _pages(pdf_data):
+            for i in range(1, 6):
+                yield f"img{i}".encode(), f"page_{i}.jpg"
+
+        async def _upload(settings, data, mime_type, filename=None):
+            await asyncio.sleep(0.01 * (6 - int(filename[5])))
+            return f"media_{filename}"
+
+        mock_whatsapp["download"].return_value = sample_pdf_bytes
+        mock_whatsapp["upload"].side_effect = _upload
+        update_session(SENDER, intent="pdf_to_image")
+        with patch("utils.pdf_converter.pdf_to_images", side_effect=_pages):
+            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+
+        captions = [c.kwargs["caption"] for c in mock_whatsapp["send_img"].call_args_list]
+        assert captions == [f"page_{i}.jpg" for i in range(1, 6)]
+
+    async def test_cancel_stops_uploads_waiting_for_a_queue_slot(self, mock_whatsapp):
+        finished = []
+
+        async def _upload(settings, data, mime_type, filename=None):
+            await asyncio.sleep(0.05)
+            finished.append(filename)
+            return f"media_{filename}"
+
+        mock_whatsapp["upload"].side_effect = _upload
+        pages = [(b"img", f"page_{i}.jpg") for i in range(1, flow.PAGE_UPLOAD_CONCURRENCY + 3)]
+        send = asyncio.create_task(flow._send_pdf_pages(MOCK_SETTINGS, SENDER, pages))
+        await asyncio.sleep(0.01)  # queue full, renderer waiting to put the next page
+        send.cancel()
+        await asyncio.gather(send, return_exceptions=True)
+        await asyncio.sleep(0.1)
+
+        assert finished == []
+
+    async def test_render_failure_reports_error(self, mock_whatsapp, sample_pdf_bytes):
+        from utils.session import update_session
+
+        def _pages(pdf_data):
+            yield b"img1", "page_1.jpg"
+            raise RuntimeError("poppler crashed")
+
+        mock_whatsapp["download"].return_value = sample_pdf_bytes
+        update_session(SENDER, intent="pdf_to_image")
+        with patch("utils.pdf_converter.pdf_to_images", side_effect=_pages):
+            await handle_message(_document_message(), SENDER, MOCK_SETTINGS)
+
+        last_text = mock_whatsapp["send_text"].call_args.args[2]
+        assert "failed" in last_text.lower()
+        assert get_session(SENDER).intent is None
+
+
+class TestIntentRegistry:
+    def test_every_intent_has_a_handler(self):
+        missing = [i for i in Intent if i != Intent.UNKNOWN and i not in INTENT_HANDLERS]
+        assert missing == []
+
+    def test_every_message_kind_has_a_handler(self):
+        kinds = {"text", "image", "document", "list_reply", "button_reply", "interactive"}
+        assert set(MESSAGE_HANDLERS) == kinds
+
+    async def test_quality_button_sets_compress_quality(self, mock_whatsapp):
+        await handle_message(_button_reply_message("btn_quality_low"), SENDER, MOCK_SETTINGS)
+        session = get_session(SENDER)
+        assert session.intent == "compress"
+        assert session.compress_quality == "low"
+
+
+class TestFileTimestamp:
+    def test_matches_strftime(self):
+        from datetime import datetime
+
+        with patch("utils.flow.time.time", return_value=1_700_000_000.5):
+            stamp = _file_timestamp()
+            assert _file_time() == stamp[-6:]
+        assert stamp == datetime.fromtimestamp(1_700_000_000).strftime("%Y%m%d_%H%M%S")
+
+
+class TestConversionId:
+    def test_ids_are_unique_and_share_the_process_prefix(self):
+        ids = [_new_conversion_id() for _ in range(100)]
+        assert len(set(ids)) == 100
+        assert all(i.startswith(_CONVERSION_ID_PREFIX) for i in ids)
+
+
+class TestHandleMessages:
+    async def test_senders_run_in_parallel_but_each_in_order(self, mock_whatsapp):
+        events = []
+
+        async def _send_text(settings, recipient, text):
+            events.append(("start", recipient))
+            await asyncio.sleep(0.02)
+            events.append(("end", recipient))
+
+        mock_whatsapp["send_text"].side_effect = _send_text
+        messages = [
+            {"id": "m1", "type": "sticker", "from": "a"},
+            {"id": "m2", "type": "sticker", "from": "a"},
+            {"id": "m3", "type": "sticker", "from": "b"},
+        ]
+        await handle_messages(messages, MOCK_SETTINGS)
+
+        assert events[:2] == [("start", "a"), ("start", "b")]
+        a_events = [kind for kind, who in events if who == "a"]
+        assert a_events == ["start", "end", "start", "end"]
+        assert _sender_locks == {}
+
+    async def test_one_failure_does_not_stop_the_rest(self, mock_whatsapp):
+        mock_whatsapp["send_text"].side_effect = [RuntimeError("boom"), None]
+        messages = [
+            {"id": "m1", "type": "sticker", "from": "a"},
+            {"id": "m2", "type": "sticker", "from": "b"},
+        ]
+        await handle_messages(messages, MOCK_SETTINGS)
+
+        assert mock_whatsapp["send_text"].call_count == 2
+
+
+class TestMessageWorkers:
+    async def test_enqueue_handles_inline_without_workers(self, mock_whatsapp):
+        await enqueue_messages([{"id": "m1", "type": "sticker", "from": SENDER}], MOCK_SETTINGS)
+        mock_whatsapp["send_text"].assert_called_once()
+
+    async def test_workers_handle_queued_messages(self, mock_whatsapp):
+        workers = asyncio.create_task(run_message_workers())
+        await asyncio.sleep(0)
+        await enqueue_messages([{"id": "m1", "type": "sticker", "from": SENDER}], MOCK_SETTINGS)
+        assert mock_whatsapp["send_text"].call_count == 0
+
+        await asyncio.sleep(0.01)
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+        mock_whatsapp["send_text"].assert_called_once()
+
+    async def test_drain_finishes_queued_and_running_messages(self, mock_whatsapp):
+        async def _send_text(settings, recipient, text):
+            await asyncio.sleep(0.02)
+
+        mock_whatsapp["send_text"].side_effect = _send_text
+        workers = asyncio.create_task(flow.run_message_workers())
+        await asyncio.sleep(0)
+        messages = [{"id": f"m{i}", "type": "sticker", "from": SENDER} for i in range(3)]
+        await flow.enqueue_messages(messages, MOCK_SETTINGS)
+        await asyncio.sleep(0)
+
+        assert await flow.drain_message_queue()
+        assert flow._message_queue is None
+        assert mock_whatsapp["send_text"].await_count == 3
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+
+    async def test_drain_gives_up_after_timeout(self, mock_whatsapp):
+        async def _send_text(settings, recipient, text):
+            await asyncio.sleep(1)
+
+        mock_whatsapp["send_text"].side_effect = _send_text
+        workers = asyncio.create_task(flow.run_message_workers())
+        await asyncio.sleep(0)
+        await flow.enqueue_messages([{"id": "m1", "type": "sticker", "from": SENDER}], MOCK_SETTINGS)
+        await asyncio.sleep(0)
+
+        assert not await flow.drain_message_queue(timeout=0.01)
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+
+    async def test_busy_sender_does_not_hold_up_other_senders(self, mock_whatsapp):
+        release = asyncio.Event()
+        handled = []
+
+        async def _send_text(settings, recipient, text):
+            if recipient == "a":
+                await release.wait()
+            handled.append(recipient)
+
+        mock_whatsapp["send_text"].side_effect = _send_text
+        workers = asyncio.create_task(run_message_workers())
+        await asyncio.sleep(0)
+        busy = [{"id": f"a{i}", "type": "sticker", "from": "a"} for i in range(flow.MESSAGE_CONCURRENCY + 2)]
+        await enqueue_messages(busy, MOCK_SETTINGS)
+        await enqueue_messages([{"id": "b1", "type": "sticker", "from": "b"}], MOCK_SETTINGS)
+        await asyncio.sleep(0.01)
+        assert handled == ["b"]
+
+        release.set()
+        assert await flow.drain_message_queue()
+        assert handled == ["b"] + ["a"] * len(busy)
+        workers.cancel()
+        await asyncio.gather(workers, return_exceptions=True)
+
+    async def test_redelivered_message_is_dropped(self, mock_whatsapp):
+        message = {"id": "wamid.1", "type": "sticker", "from": SENDER}
+        await enqueue_messages([message], MOCK_SETTINGS)
+        await enqueue_messages([message], MOCK_SETTINGS)
+
+        mock_whatsapp["send_text"].assert_called_once()
+
+    async def test_message_id_is_forgotten_when_enqueue_is_cancelled(self, mock_whatsapp):
+        queue = asyncio.Queue(maxsize=1)
+        queue.put_nowait(("placeholder", MOCK_SETTINGS))
+        with patch("utils.flow._message_queue", queue):
+            enqueue = asyncio.create_task(
+                flow.enqueue_messages([{"id": "wamid.1", "type": "sticker", "from": SENDER}], MOCK_SETTINGS)
+            )
+            await asyncio.sleep(0)
+            enqueue.cancel()
+            await asyncio.gather(enqueue, return_exceptions=True)
+
+        assert "wamid.1" not in flow._seen_message_ids
+
+    async def test_message_id_is_forgotten_after_ttl(self, mock_whatsapp):
+        message = {"id": "wamid.1", "type": "sticker", "from": SENDER}
+        await enqueue_messages([message], MOCK_SETTINGS)
+        _seen_message_ids["wamid.1"] -= MESSAGE_DEDUP_TTL + 1
+        await enqueue_messages([message], MOCK_SETTINGS)
+
+        assert mock_whatsapp["send_text"].call_count == 2
@@ -157,6 +157,13 @@ class TestDetectIntentFromCaption:
 
 
 class TestDetectIntentFromButton:
+    def test_maps_are_read_only(self):
+        from utils.intent import BUTTON_INTENT_MAP, LIST_INTENT_MAP
+        with pytest.raises(TypeError):
+            BUTTON_INTENT_MAP["btn_new"] = Intent.HELP
+        with pytest.raises(TypeError):
+            LIST_INTENT_MAP["list_new"] = Intent.HELP
+
     def test_convert_button(self):
         assert detect_intent_from_button("btn_convert") == Intent.CONVERT
 
@@ -206,3 +213,29 @@ class TestDetectIntentFromList:
 
     def test_unknown_list(self):
         assert detect_intent_from_list("list_nope") == Intent.UNKNOWN
+
+
+class TestKeywordPriority:
+    def test_exact_keywords_match_full_scan(self):
+        from utils.intent import INTENT_KEYWORDS, _scan_keywords
+
+        for _, keywords in INTENT_KEYWORDS:
+            for keyword in keywords:
+                assert detect_intent(keyword) == _scan_keywords(keyword)
+                assert detect_intent(f"please {keyword} now") == _scan_keywords(f"please {keyword} now")
+
+    def test_keyword_containing_higher_priority_one(self):
+        # "unlock pdf" contains "lock", but UNLOCK_PDF is listed first
+        assert detect_intent("unlock pdf") == Intent.UNLOCK_PDF
+
+    def test_long_text_bypasses_cache(self):
+        from utils.intent import INTENT_CACHE_MAX_LEN, _scan_keywords_cached
+
+        _scan_keywords_cached.cache_clear()
+        detect_intent("please merge these")
+        detect_intent("please merge these")
+        assert _scan_keywords_cached.cache_info().hits == 1
+
+        long_text = "x" * INTENT_CACHE_MAX_LEN + " merge"
+        assert detect_intent(long_text) == Intent.MERGE
+        assert _scan_keywords_cached.cache_info().currsize == 1
@@ -0,0 +1,46 @@
+"""Tests for the background outbound sender."""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+import utils.outbound as outbound
+from utils.outbound import run_outbound_sender, send_in_background
+
+
+class TestSendInBackground:
+    async def test_runs_inline_without_sender(self):
+        func = AsyncMock()
+        await send_in_background(func, "a", key="b")
+        func.assert_awaited_once_with("a", key="b")
+
+    async def test_sender_sends_queued_calls(self):
+        func = AsyncMock()
+        task = asyncio.create_task(run_outbound_sender())
+        await asyncio.sleep(0)
+
+        for i in range(3):
+            await send_in_background(func, i)
+        func.assert_not_awaited()
+
+        await asyncio.sleep(outbound.OUTBOUND_MAX_WAIT * 2)
+        assert sorted(c.args[0] for c in func.await_args_list) == [0, 1, 2]
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert outbound._outbound_queue is None
+
+    async def test_flushes_queue_on_shutdown(self):
+        func = AsyncMock()
+        task = asyncio.create_task(run_outbound_sender())
+        await asyncio.sleep(0)
+
+        await send_in_background(func, "late")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        func.assert_awaited_once_with("late")
+
+    async def test_failures_are_logged_not_raised(self):
+        failing = AsyncMock(side_effect=RuntimeError("boom"))
+        ok = AsyncMock()
+        await outbound._send_batch([(failing, (), {}), (ok, (), {})])
+        ok.assert_awaited_once()
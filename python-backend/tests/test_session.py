@@ -1,22 +1,15 @@
 """Tests for session management."""
 
+import os
 import time
 import pytest
 from utils.session import (
-    get_session, update_session, add_image_to_session,
+    get_session, update_session, reset_session, add_image_to_session,
     clear_session, get_active_session_count, cleanup_expired,
-    _sessions, SESSION_TTL,
+    _sessions, SESSION_TTL, MAX_SESSION_IMAGES, sweep_stale_blobs,
 )
 
 
-@pytest.fixture(autouse=True)
-def clean_sessions():
-    """Clear all sessions before each test."""
-    _sessions.clear()
-    yield
-    _sessions.clear()
-
-
 class TestGetSession:
     def test_creates_new_session(self):
         session = get_session("1234567890")
@@ -53,6 +46,10 @@ class TestUpdateSession:
         session = update_session("111", nonexistent_field="value")
         assert not hasattr(session, "nonexistent_field")
 
+    def test_session_has_no_instance_dict(self):
+        session = get_session("111")
+        assert not hasattr(session, "__dict__")
+
     def test_touches_timestamp(self):
         session = get_session("111")
         old_time = session.updated_at
@@ -61,6 +58,18 @@ class TestUpdateSession:
         assert session.updated_at >= old_time
 
 
+class TestResetSession:
+    def test_sets_step_and_drops_images(self):
+        add_image_to_session("111", "img_1", "image/jpeg")
+        update_session("111", watermark_text="DRAFT")
+
+        session = reset_session("111", "collecting_images", "merge")
+        assert session.state == "collecting_images"
+        assert session.intent == "merge"
+        assert session.images == []
+        assert session.watermark_text == "DRAFT"
+
+
 class TestAddImageToSession:
     def test_adds_image(self):
         get_session("111")
@@ -75,6 +84,12 @@ class TestAddImageToSession:
         session = add_image_to_session("111", "m3", "image/webp")
         assert session.image_count == 3
 
+    def test_caps_collection(self):
+        for i in range(MAX_SESSION_IMAGES + 5):
+            session = add_image_to_session("111", f"m{i}", "image/jpeg")
+        assert session.image_count == MAX_SESSION_IMAGES
+        assert session.images[-1]["media_id"] == f"m{MAX_SESSION_IMAGES - 1}"
+
 
 class TestClearSession:
     def test_resets_everything(self):
@@ -114,6 +129,41 @@ class TestSessionProperties:
         session.pdf_data = b"fake pdf"
         assert session.has_pdf
 
+    def test_pdf_data_lives_in_blob_file(self, isolated_blob_dir):
+        session = get_session("111")
+        session.pdf_data = b"fake pdf"
+        path = session.pdf_path
+        assert os.path.dirname(path) == isolated_blob_dir
+        assert session.pdf_data == b"fake pdf"
+
+        clear_session("111")
+        assert session.pdf_path is None
+        assert not os.path.exists(path)
+
+    def test_blob_name_does_not_use_sender(self, isolated_blob_dir):
+        session = get_session("../../etc/x")
+        session.pdf_data = b"fake pdf"
+        assert os.path.dirname(session.pdf_path) == isolated_blob_dir
+        assert "etc" not in os.path.basename(session.pdf_path)
+        session.pdf_data = None
+
+    def test_sweep_removes_stale_blobs_only(self, isolated_blob_dir):
+        session = get_session("111")
+        session.pdf_data = b"live"
+        stale = os.path.join(isolated_blob_dir, "docbot_stale")
+        other = os.path.join(isolated_blob_dir, "unrelated")
+        for path in (stale, other):
+            with open(path, "wb") as f:
+                f.write(b"x")
+
+        try:
+            assert sweep_stale_blobs() == 1
+            assert not os.path.exists(stale)
+            assert os.path.exists(other)
+            assert session.pdf_data == b"live"
+        finally:
+            session.pdf_data = None
+
 
 class TestCleanupExpired:
     def test_removes_expired(self):
@@ -125,12 +175,39 @@ class TestCleanupExpired:
         assert "111" not in _sessions
         assert "222" in _sessions
 
+    def test_stops_at_first_live_session(self):
+        s1 = get_session("111")
+        s2 = get_session("222")
+        get_session("333")
+        s1.updated_at = s2.updated_at = time.time() - SESSION_TTL - 1
+        assert cleanup_expired() == 2
+        assert list(_sessions) == ["333"]
+
     def test_no_expired(self):
         get_session("111")
         removed = cleanup_expired()
         assert removed == 0
 
 
+class TestSessionLimit:
+    def test_evicts_least_recently_used(self, monkeypatch):
+        monkeypatch.setattr("utils.session.MAX_SESSIONS", 2)
+        get_session("111")
+        get_session("222")
+        get_session("111")
+        get_session("333")
+        assert list(_sessions) == ["111", "333"]
+
+    def test_eviction_discards_pdf(self, monkeypatch):
+        monkeypatch.setattr("utils.session.MAX_SESSIONS", 1)
+        session = get_session("111")
+        session.pdf_data = b"fake pdf"
+        path = session.pdf_path
+        get_session("222")
+        assert "111" not in _sessions
+        assert not os.path.exists(path)
+
+
 class TestGetActiveSessionCount:
     def test_counts_active(self):
         get_session("111")
@@ -138,7 +215,8 @@ class TestGetActiveSessionCount:
         assert get_active_session_count() == 2
 
     def test_excludes_expired(self):
-        get_session("111")
-        s2 = get_session("222")
-        s2.updated_at = time.time() - SESSION_TTL - 1
+        # The least recently used session is the one that expires first
+        s1 = get_session("111")
+        get_session("222")
+        s1.updated_at = time.time() - SESSION_TTL - 1
         assert get_active_session_count() == 1
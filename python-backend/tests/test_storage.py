@@ -0,0 +1,47 @@
+"""Tests for conversion log storage."""
+
+import asyncio
+import time
+
+import pytest
+
+import utils.storage as storage
+
+
+class TestConversionLogWriter:
+    async def test_cancel_during_write_keeps_every_record(self, monkeypatch):
+        save = storage._save_conversions
+
+        def _slow_save(conversions):
+            time.sleep(0.05)
+            save(conversions)
+
+        monkeypatch.setattr(storage, "_save_conversions", _slow_save)
+        monkeypatch.setattr(storage, "LOG_MAX_WAIT", 0)
+
+        writer = asyncio.create_task(storage.run_conversion_log_writer())
+        await asyncio.sleep(0)
+        storage.log_conversion("a", "111", "success", 1)
+        await asyncio.sleep(0.01)  # first batch is now being written
+        storage.log_conversion("b", "111", "success", 1)
+        writer.cancel()
+        await asyncio.gather(writer, return_exceptions=True)
+
+        assert {c["id"] for c in storage._load_conversions()} == {"a", "b"}
+
+
+class TestSaveConversions:
+    def test_failed_write_keeps_previous_log(self, monkeypatch):
+        storage._save_conversions([{"id": "a"}])
+
+        def _broken_dump(obj, f, **kwargs):
+            f.write("[{")
+            raise OSError("disk full")
+
+        with monkeypatch.context() as m:
+            m.setattr(storage.json, "dump", _broken_dump)
+            with pytest.raises(OSError):
+                storage._save_conversions([{"id": "b"}])
+
+        assert storage._load_conversions() == [{"id": "a"}]
+        assert list(storage.STORAGE_DIR.iterdir()) == [storage.CONVERSIONS_FILE]
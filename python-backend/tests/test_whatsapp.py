@@ -0,0 +1,103 @@
+"""Tests for the WhatsApp API client helpers."""
+
+import httpx
+import orjson
+import pytest
+
+import utils.whatsapp as whatsapp
+from utils.whatsapp import _client, close_http_client, verify_webhook_token
+
+
+@pytest.fixture
+async def mock_graph_api(monkeypatch):
+    """Route the shared HTTP client through a handler; closed after the test."""
+    def _install(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(whatsapp, "_http_client", client)
+        return client
+
+    yield _install
+    await close_http_client()
+
+
+class TestSharedClient:
+    async def test_client_is_reused(self):
+        try:
+            assert _client() is _client()
+        finally:
+            await close_http_client()
+
+    async def test_close_starts_fresh_client(self):
+        first = _client()
+        await close_http_client()
+        assert first.is_closed
+        second = _client()
+        assert second is not first
+        await close_http_client()
+
+
+class TestVerifyWebhookToken:
+    async def test_matching_token(self):
+        assert await verify_webhook_token("secret", "secret")
+
+    async def test_missing_token(self):
+        assert not await verify_webhook_token(None, "secret")
+
+    async def test_wrong_token(self):
+        assert not await verify_webhook_token("guess", "secret")
+
+    async def test_no_token_configured(self):
+        assert not await verify_webhook_token(None, "")
+        assert not await verify_webhook_token("", "")
+        assert not await verify_webhook_token("", None)
+        assert not await verify_webhook_token("secret", "")
+
+
+class TestSendPayload:
+    async def test_text_message_body_is_json(self, mock_graph_api):
+        seen = {}
+
+        def handler(request):
+            seen["content_type"] = request.headers["content-type"]
+            seen["body"] = orjson.loads(request.content)
+            return httpx.Response(200, json={"messages": [{"id": "wamid.1"}]})
+
+        mock_graph_api(handler)
+        settings = {"access_token": "t", "phone_number_id": "123"}
+
+        await whatsapp.send_text_message(settings, "9199", "héllo")
+
+        assert seen["content_type"] == "application/json"
+        assert seen["body"]["text"] == {"body": "héllo"}
+        assert seen["body"]["to"] == "9199"
+
+
+class TestFetchMedia:
+    async def test_streams_file_body(self, mock_graph_api):
+        body = bytes(range(256)) * 1000
+
+        def handler(request):
+            if request.url.path.endswith("/media_1"):
+                return httpx.Response(200, json={"url": "https://cdn.example/file"})
+            return httpx.Response(200, content=body)
+
+        mock_graph_api(handler)
+
+        assert await whatsapp._fetch_media({"access_token": "t"}, "media_1") == body
+
+    async def test_rejects_reported_size_before_downloading(self, mock_graph_api):
+        fetched = []
+
+        def handler(request):
+            if request.url.path.endswith("/media_1"):
+                return httpx.Response(200, json={"url": "https://cdn.example/file", "file_size": 2048})
+            fetched.append(request.url)
+            return httpx.Response(200, content=b"x" * 2048)
+
+        mock_graph_api(handler)
+
+        with pytest.raises(whatsapp.MediaTooLargeError) as exc:
+            await whatsapp._fetch_media({"access_token": "t"}, "media_1", max_bytes=1024)
+
+        assert exc.value.size == 2048
+        assert fetched == []
@@ -0,0 +1,26 @@
+"""Tests for the CPU worker pool helper."""
+
+import os
+import pytest
+
+from utils.pdf_tools import get_pdf_info, split_pdf
+from utils.workers import run_cpu_bound
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+class TestRunCpuBound:
+    async def test_runs_module_function_in_pool(self, sample_pdf_bytes):
+        info = await run_cpu_bound(get_pdf_info, sample_pdf_bytes)
+        assert info["pages"] == 3
+        assert await run_cpu_bound(_worker_pid) != os.getpid()
+
+    async def test_closure_runs_on_thread(self):
+        parent = os.getpid()
+        assert await run_cpu_bound(lambda: os.getpid()) == parent
+
+    async def test_exceptions_propagate(self, sample_pdf_bytes):
+        with pytest.raises(ValueError):
+            await run_cpu_bound(split_pdf, sample_pdf_bytes, "abc")
@@ -0,0 +1,27 @@
+"""
+Batch collection for the background queue consumers (conversion log
+writer, outbound sender).
+"""
+
+import asyncio
+from typing import Any, List
+
+
+async def collect_batch(queue: asyncio.Queue, batch: List[Any], max_items: int, max_wait: float) -> None:
+    """
+    Wait for one item from queue, then keep adding items to batch until it
+    holds max_items or max_wait seconds have passed.
+    Items go straight into the caller's list, so the ones already taken
+    are still there to flush if the caller is cancelled mid-collection.
+    """
+    loop = asyncio.get_running_loop()
+    batch.append(await queue.get())
+    deadline = loop.time() + max_wait
+    while len(batch) < max_items:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            return
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            return
@@ -4,14 +4,25 @@ Uses Pillow for image processing and img2pdf for conversion.
 """
 
 import io
+import os
 import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple
+import numpy as np
 from PIL import Image
 import img2pdf
 from utils.scanner import scan_document
 
 logger = logging.getLogger(__name__)
 
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+    logger.warning("OpenCV not installed — images are downscaled with Pillow")
+
 # Maximum dimensions for images (to prevent memory issues)
 MAX_DIMENSION = 8192
 
@@ -22,6 +33,35 @@ SUPPORTED_FORMATS = {"image/jpeg", "image/png", "image/jpg", "image/webp"}
 COMPRESS_MAX_DIMENSION = 2048
 COMPRESS_QUALITY = 40
 
+# Re-encode quality for pages from lossy uploads (no chroma subsampling)
+JPEG_QUALITY = 95
+
+# Uploads whose pages stay lossless PNG (screenshots, line art, text)
+LOSSLESS_FORMATS = {"image/png"}
+
+# Merges with at least this many pages render them on a thread pool.
+# Pillow and OpenCV release the GIL while decoding, scanning and encoding,
+# so pages really do run in parallel.
+PARALLEL_MERGE_MIN_PAGES = 3
+MERGE_WORKERS = os.cpu_count() or 1
+# Inside a utils.workers pool process every core already has a worker, so
+# each merge only adds a couple of threads on top
+POOL_MERGE_WORKERS = 2
+
+
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientation → counter-clockwise rotation that makes the image upright
+EXIF_ROTATIONS = {3: 180, 6: 270, 8: 90}
+
+
+def _exif_orientation(image: Image.Image) -> int:
+    """Return the EXIF orientation tag, or 1 (upright) if absent or unreadable."""
+    try:
+        return image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
 
 def _process_image(image_data: bytes, mime_type: str, compress: bool = False) -> Image.Image:
     """
@@ -39,48 +79,66 @@ def _process_image(image_data: bytes, mime_type: str, compress: bool = False) ->
         raise ValueError(f"Unsupported image format: {mime_type}")
 
     image = Image.open(io.BytesIO(image_data))
+    max_dim = COMPRESS_MAX_DIMENSION if compress else MAX_DIMENSION
+
+    # Let libjpeg decode large JPEGs at 1/2, 1/4 or 1/8 scale, as thumbnail()
+    # does. The draft is asked for one pixel over max_dim so the exact resize
+    # below still runs and the result is never mistaken for the upload.
+    if image.format == "JPEG" and max(image.size) > max_dim:
+        ratio = (max_dim + 1) / max(image.size)
+        image.draft(image.mode, (int(image.width * ratio), int(image.height * ratio)))
+
+    # Read orientation before conversion; converted images carry no EXIF
+    rotation = EXIF_ROTATIONS.get(_exif_orientation(image))
 
     # Convert to RGB if necessary (for PNG with transparency)
     if image.mode in ("RGBA", "P", "LA"):
-        background = Image.new("RGB", image.size, (255, 255, 255))
-        if image.mode == "P":
-            image = image.convert("RGBA")
-        background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
-        image = background
+        image = _flatten_alpha(image)
     elif image.mode != "RGB":
         image = image.convert("RGB")
 
     # Handle EXIF orientation
-    try:
-        exif = image._getexif()
-        if exif:
-            orientation = exif.get(274)
-            if orientation:
-                rotations = {3: 180, 6: 270, 8: 90}
-                if orientation in rotations:
-                    image = image.rotate(rotations[orientation], expand=True)
-    except (AttributeError, KeyError, TypeError):
-        pass
+    if rotation:
+        image = image.rotate(rotation, expand=True)
 
     # Resize based on compress mode
-    max_dim = COMPRESS_MAX_DIMENSION if compress else MAX_DIMENSION
     if max(image.size) > max_dim:
         ratio = max_dim / max(image.size)
         new_size = (int(image.width * ratio), int(image.height * ratio))
-        image = image.resize(new_size, Image.Resampling.LANCZOS)
-        logger.info(f"Resized image to {new_size}")
+        image = _downscale(image, new_size)
+        logger.info("Resized image to %s", new_size)
 
     return image
 
 
+def _flatten_alpha(image: Image.Image) -> Image.Image:
+    """Composite an image with transparency onto white, returning RGB."""
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    # An RGBA mask is read through its alpha band, so no split() copies
+    background.paste(image, mask=image)
+    return background
+
+
+def _downscale(image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    Shrink an RGB image to size.
+    OpenCV's INTER_AREA is a SIMD box filter, several times faster than
+    Pillow's LANCZOS on large photos and just as clean for downscaling.
+    """
+    if not OPENCV_AVAILABLE:
+        return image.resize(size, Image.Resampling.LANCZOS)
+    return Image.fromarray(cv2.resize(np.asarray(image), size, interpolation=cv2.INTER_AREA))
+
+
 def _image_to_jpeg_bytes(image: Image.Image, compress: bool = False) -> bytes:
     """Convert a PIL Image to JPEG bytes."""
     img_buffer = io.BytesIO()
     if compress:
         image.save(img_buffer, format="JPEG", quality=COMPRESS_QUALITY)
     else:
-        # Max quality: no chroma subsampling, highest quality
-        image.save(img_buffer, format="JPEG", quality=100, subsampling=0)
+        image.save(img_buffer, format="JPEG", quality=JPEG_QUALITY, subsampling=0)
     img_buffer.seek(0)
     return img_buffer.getvalue()
 
@@ -93,8 +151,78 @@ def _image_to_png_bytes(image: Image.Image) -> bytes:
     return img_buffer.getvalue()
 
 
+def _is_untouched_jpeg(image: Image.Image) -> bool:
+    """
+    True if image is still the JPEG exactly as decoded from the upload.
+    Pillow only sets format on images it opened; any conversion, rotation,
+    resize or scanner crop returns a new image with format None.
+    """
+    return (
+        image.format == "JPEG"
+        and image.mode == "RGB"
+        and _exif_orientation(image) == 1
+    )
+
+
+def _strip_jpeg_metadata(data: bytes) -> bytes:
+    """
+    Return the JPEG stream without its EXIF, XMP, ICC and comment segments,
+    so camera details and GPS location never reach the PDF. APP0 (JFIF) and
+    APP14 (Adobe colour transform) are kept as they affect decoding.
+    Raises ValueError if the header is not well-formed.
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG stream")
+
+    out = bytearray(data[:2])
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Malformed JPEG segment")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # start of scan; entropy-coded data follows
+            out += data[pos:]
+            return bytes(out)
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        if end > len(data):
+            raise ValueError("Truncated JPEG segment")
+        if not (0xE1 <= marker <= 0xEF and marker != 0xEE) and marker != 0xFE:
+            out += data[pos:end]
+        pos = end
+    raise ValueError("JPEG has no image data")
+
+
+def _render_page(image_data: bytes, mime_type: str, compress: bool = False, scan: bool = True) -> bytes:
+    """
+    Process one image and return the bytes img2pdf embeds as its page.
+    Pillow decodes lazily, so with scan off an upright JPEG that fits
+    MAX_DIMENSION is never decoded at all.
+    """
+    image = _process_image(image_data, mime_type, compress=compress)
+    if scan:
+        image = scan_document(image)
+
+    if compress:
+        return _image_to_jpeg_bytes(image, compress=True)
+    if _is_untouched_jpeg(image):
+        # img2pdf embeds JPEG streams as-is, so the upload can go in directly
+        # once its metadata is dropped
+        try:
+            return _strip_jpeg_metadata(image_data)
+        except ValueError:
+            pass
+    if mime_type in LOSSLESS_FORMATS:
+        # No JPEG artifacts on sharp edges the source never had
+        return _image_to_png_bytes(image)
+    # The source was lossy already; PNG would only be slower and 3-5x larger
+    return _image_to_jpeg_bytes(image)
+
+
 def convert_image_to_pdf(
-    image_data: bytes, mime_type: str = "image/jpeg", compress: bool = False
+    image_data: bytes, mime_type: str = "image/jpeg", compress: bool = False, scan: bool = True
 ) -> bytes:
     """
     Convert an image to PDF.
@@ -103,30 +231,23 @@ def convert_image_to_pdf(
         image_data: Raw image bytes
         mime_type: MIME type of the image
         compress: If True, produce a smaller PDF (lower quality, smaller dimensions)
+        scan: If True, detect and crop the document in the photo first
 
     Returns:
         PDF file as bytes
     """
-    mode = "compressed" if compress else "normal"
-    logger.info(f"Converting image ({mode}) of type {mime_type}, size {len(image_data)} bytes")
-
-    image = _process_image(image_data, mime_type, compress=compress)
-    image = scan_document(image)
-
-    if compress:
-        img_bytes = _image_to_jpeg_bytes(image, compress=True)
-    else:
-        # Lossless PNG for maximum quality — no JPEG artifacts
-        img_bytes = _image_to_png_bytes(image)
+    logger.info("Converting image (%s) of type %s, size %d bytes",
+                "compressed" if compress else "normal", mime_type, len(image_data))
 
+    img_bytes = _render_page(image_data, mime_type, compress=compress, scan=scan)
     pdf_bytes = img2pdf.convert(img_bytes)
 
-    logger.info(f"Created PDF of size {len(pdf_bytes)} bytes")
+    logger.info("Created PDF of size %d bytes", len(pdf_bytes))
     return pdf_bytes
 
 
 def merge_images_to_pdf(
-    images: List[Tuple[bytes, str]], compress: bool = False
+    images: List[Tuple[bytes, str]], compress: bool = False, scan: bool = True
 ) -> bytes:
     """
     Merge multiple images into a single multi-page PDF.
@@ -134,6 +255,7 @@ def merge_images_to_pdf(
     Args:
         images: List of (image_data, mime_type) tuples
         compress: If True, compress each page
+        scan: If True, detect and crop the document on each page
 
     Returns:
         Multi-page PDF as bytes
@@ -141,28 +263,39 @@ def merge_images_to_pdf(
     if not images:
         raise ValueError("No images to merge")
 
-    logger.info(f"Merging {len(images)} images into PDF (compress={compress})")
+    logger.info("Merging %d images into PDF (compress=%s)", len(images), compress)
 
-    pages = []
-    for i, (image_data, mime_type) in enumerate(images):
-        image = _process_image(image_data, mime_type, compress=compress)
-        image = scan_document(image)
-        if compress:
-            img_bytes = _image_to_jpeg_bytes(image, compress=True)
-        else:
-            img_bytes = _image_to_png_bytes(image)
-        pages.append(img_bytes)
-        logger.info(f"Processed page {i + 1}/{len(images)}")
+    def render(image: Tuple[bytes, str]) -> bytes:
+        image_data, mime_type = image
+        return _render_page(image_data, mime_type, compress=compress, scan=scan)
+
+    if len(images) >= PARALLEL_MERGE_MIN_PAGES:
+        workers = POOL_MERGE_WORKERS if multiprocessing.parent_process() else MERGE_WORKERS
+        with ThreadPoolExecutor(max_workers=min(workers, len(images))) as executor:
+            pages = list(executor.map(render, images))
+    else:
+        pages = [render(image) for image in images]
 
     pdf_bytes = img2pdf.convert(pages)
 
-    logger.info(f"Created merged PDF: {len(images)} pages, {len(pdf_bytes)} bytes")
+    logger.info("Created merged PDF: %d pages, %d bytes", len(images), len(pdf_bytes))
     return pdf_bytes
 
 
+# Leading bytes of the formats WhatsApp delivers
+_IMAGE_MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")
+
+
+def _has_image_magic(data: bytes) -> bool:
+    """True if data starts with the signature of a common image format."""
+    return data.startswith(_IMAGE_MAGIC) or (data[:4] == b"RIFF" and data[8:12] == b"WEBP")
+
+
 def validate_image(image_data: bytes) -> bool:
     """
     Validate that the data is a valid image.
+    JPEG, PNG, GIF and WebP are recognised by their signature alone; anything
+    else is checked with a full Pillow verify.
     
     Args:
         image_data: Raw image bytes
@@ -170,6 +303,9 @@ def validate_image(image_data: bytes) -> bool:
     Returns:
         True if valid image, False otherwise
     """
+    if _has_image_magic(image_data):
+        return True
+
     try:
         image = Image.open(io.BytesIO(image_data))
         image.verify()
@@ -3,6 +3,9 @@ User-facing error messages in English and Hindi.
 Maps internal error codes to friendly messages sent back via WhatsApp.
 """
 
+from functools import lru_cache
+from typing import Any, Tuple
+
 
 class ErrorMessages:
     """Bilingual user-facing error messages."""
@@ -94,6 +97,8 @@ class ErrorMessages:
         },
     }
 
+    DEFAULT_MESSAGE = "An error occurred."
+
     @classmethod
     def get(cls, key: str, lang: str = "en", **kwargs) -> str:
         """
@@ -107,18 +112,56 @@ class ErrorMessages:
         Returns:
             Formatted message string
         """
-        msg_dict = cls.MESSAGES.get(key, {})
-        msg = msg_dict.get(lang, msg_dict.get("en", "An error occurred."))
-        try:
-            return msg.format(**kwargs)
-        except (KeyError, IndexError):
+        msg = _TEMPLATES.get((key, lang))
+        if msg is None:
+            msg = _TEMPLATES.get((key, "en"), cls.DEFAULT_MESSAGE)
+        if not kwargs:
             return msg
+        items = tuple(sorted(kwargs.items()))
+        try:
+            return _format_cached(msg, items)
+        except TypeError:
+            # Unhashable substitution value; format without the cache
+            return _format(msg, items)
 
     @classmethod
     def bilingual(cls, key: str, **kwargs) -> str:
         """Get message in both English and Hindi."""
-        en = cls.get(key, "en", **kwargs)
-        hi = cls.get(key, "hi", **kwargs)
-        if en == hi:
-            return en
-        return f"{en}\n{hi}"
+        if not kwargs:
+            cached = _BILINGUAL.get(key)
+            if cached is not None:
+                return cached
+        return _join_languages(cls.get(key, "en", **kwargs), cls.get(key, "hi", **kwargs))
+
+
+def _format(template: str, items: Tuple[Tuple[str, Any], ...]) -> str:
+    try:
+        return template.format_map(dict(items))
+    except (KeyError, IndexError):
+        return template
+
+
+# Call sites pass a handful of fixed substitutions ("10 MB", "PDF, Word, ..."),
+# so the formatted strings repeat and are kept once formatted
+FORMATTED_CACHE_SIZE = 512
+
+_format_cached = lru_cache(maxsize=FORMATTED_CACHE_SIZE)(_format)
+
+
+def _join_languages(en: str, hi: str) -> str:
+    if en == hi:
+        return en
+    return f"{en}\n{hi}"
+
+
+# MESSAGES flattened to (key, lang) → template, and the unformatted
+# bilingual text per key, both built once at import
+_TEMPLATES = {
+    (key, lang): template
+    for key, langs in ErrorMessages.MESSAGES.items()
+    for lang, template in langs.items()
+}
+_BILINGUAL = {
+    key: _join_languages(ErrorMessages.get(key, "en"), ErrorMessages.get(key, "hi"))
+    for key in ErrorMessages.MESSAGES
+}
@@ -4,19 +4,27 @@ Routes incoming WhatsApp messages through intent detection and session state
 to determine the appropriate action. Handles all DocBot features.
 """
 
-import uuid
 import time
+import asyncio
+import itertools
 import logging
+import secrets
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Tuple
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 from utils.intent import (
     Intent, detect_intent, detect_intent_from_caption,
     detect_intent_from_button, detect_intent_from_list,
 )
-from utils.session import get_session, update_session, add_image_to_session, clear_session
+from utils.session import (
+    Session, get_session, update_session, reset_session, add_image_to_session, clear_session,
+    MAX_SESSION_IMAGES,
+)
 from utils.converter import convert_image_to_pdf, merge_images_to_pdf
 from utils.whatsapp import (
+    MediaTooLargeError,
     download_media,
     upload_media,
     send_document_message,
@@ -27,10 +35,23 @@ from utils.whatsapp import (
     send_image_message,
 )
 from utils.storage import log_conversion
+from utils.outbound import send_in_background
+from utils.workers import run_cpu_bound
 from utils.errors import ErrorMessages
 
 logger = logging.getLogger(__name__)
 
+# Conversion IDs only correlate log records: a random per-process prefix
+# plus a counter is unique enough and far cheaper than uuid4().
+_CONVERSION_ID_PREFIX = secrets.token_hex(4)
+_next_conversion_number = itertools.count().__next__
+
+
+def _new_conversion_id() -> str:
+    """Return a process-unique ID for a conversion's log records."""
+    return f"{_CONVERSION_ID_PREFIX}{_next_conversion_number():08x}"
+
+
 # ── Feature Menu (WhatsApp List Message) ──────────────────────────
 
 FEATURE_SECTIONS = [
@@ -80,6 +101,12 @@ FEATURE_SECTIONS_2 = [
     },
 ]
 
+ROTATE_BUTTONS = (
+    {"id": "btn_rotate_90", "title": "90°"},
+    {"id": "btn_rotate_180", "title": "180°"},
+    {"id": "btn_rotate_270", "title": "270°"},
+)
+
 GREETING_BODY = (
     "Hi! I'm *DocBot* — your free document tool.\n\n"
     "I can convert, compress, merge, split, rotate, OCR, watermark, "
@@ -112,6 +139,7 @@ HELP_TEXT = (
 )
 
 MERGE_STARTED_TEXT = "Send me the images/PDFs you want to combine.\nType *done* when you're ready."
+MERGE_FULL_TEXT = f"That's the maximum of {MAX_SESSION_IMAGES} files. Type *done* to merge them."
 COMPRESS_READY_TEXT = "Send me an image or PDF and I'll compress it."
 CANCEL_TEXT = "Cancelled. Send me a file or type *help* to see options."
 
@@ -121,6 +149,23 @@ FALLBACK_BODY = (
 )
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+MAX_MERGE_BYTES = MAX_FILE_SIZE * 5
+
+# Parallel media downloads per merge, to stay polite to the Graph API
+MEDIA_DOWNLOAD_CONCURRENCY = 8
+
+# Page images uploaded in parallel for PDF → images
+PAGE_UPLOAD_CONCURRENCY = 4
+
+# Messages handled at once, by handle_messages() or the background workers
+MESSAGE_CONCURRENCY = 8
+MESSAGE_QUEUE_SIZE = 1024
+MESSAGE_DRAIN_TIMEOUT = 60.0  # seconds shutdown waits for queued messages
+
+# Webhook deliveries are at-least-once; message IDs seen within this window
+# are dropped as redeliveries
+MESSAGE_DEDUP_TTL = 3600
+MESSAGE_DEDUP_MAX = 100_000
 
 # Intents that need a PDF file sent next
 PDF_INPUT_INTENTS = {
@@ -130,210 +175,347 @@ PDF_INPUT_INTENTS = {
     "ocr",
 }
 
+# PDF intents handed straight to _process_conversion / _process_pdf_tool
+# under their own name, with no extra parameters
+PDF_CONVERSION_INTENTS = frozenset({"pdf_to_word", "pdf_to_image", "pdf_to_ppt", "pdf_to_excel"})
+PLAIN_PDF_TOOL_INTENTS = frozenset({"page_numbers", "pdf_archive"})
+
 # Intents that need an image file sent next
 IMAGE_INPUT_INTENTS = {"convert", "enhance", "remove_bg", "ocr"}
 
+# Tools that take a text reply after the PDF: intent → (session field the
+# text is stored in, _process_pdf_tool keyword it is passed as)
+AWAITED_TEXT_INPUTS: Dict[str, Tuple[str, str]] = {
+    "split": ("page_spec", "page_spec"),
+    "reorder": ("page_spec", "order_spec"),
+    "lock_pdf": ("pdf_password", "password"),
+    "unlock_pdf": ("pdf_password", "password"),
+    "watermark": ("watermark_text", "watermark_text"),
+}
+
 # Intents that need text input after PDF is received
-TEXT_AFTER_PDF_INTENTS = {"split", "reorder", "lock_pdf", "unlock_pdf", "watermark"}
+TEXT_AFTER_PDF_INTENTS = set(AWAITED_TEXT_INPUTS)
 
+# Message types that carry nothing to act on; dropped without a reply
+IGNORED_MESSAGE_TYPES = frozenset({"reaction", "system"})
 
-# ── Main entry point ───────────────────────────────────────────────
 
-async def handle_message(message: dict, sender: str, settings: dict) -> None:
-    """Main message handler."""
-    message_id = message.get("id")
-    if message_id:
-        await send_typing_indicator(settings, sender, message_id)
+# ── Message parsing ────────────────────────────────────────────────
+
+class ParsedMessage(NamedTuple):
+    """The fields of a webhook message that the handlers need, read once."""
+    kind: str  # text, image, document, list_reply, button_reply, interactive, or the raw type
+    message_id: Optional[str]
+    text: str = ""  # text body, or the media caption
+    reply_id: str = ""  # list/button reply id
+    media_id: Optional[str] = None
+    mime_type: str = ""
+    filename: str = ""
+
 
+def parse_message(message: dict) -> ParsedMessage:
+    """Walk a WhatsApp webhook message dict once into a ParsedMessage."""
+    message_id = message.get("id")
     message_type = message.get("type")
 
     if message_type == "text":
-        text = message.get("text", {}).get("body", "")
-        await _handle_text(sender, text, settings)
+        return ParsedMessage("text", message_id, text=message.get("text", {}).get("body", ""))
+
+    if message_type == "image":
+        image_info = message.get("image", {})
+        return ParsedMessage(
+            "image", message_id,
+            text=image_info.get("caption") or "",
+            media_id=image_info.get("id"),
+            mime_type=image_info.get("mime_type", "image/jpeg"),
+        )
 
-    elif message_type == "image":
-        await _handle_image(message, sender, settings)
+    if message_type == "document":
+        doc_info = message.get("document", {})
+        return ParsedMessage(
+            "document", message_id,
+            media_id=doc_info.get("id"),
+            mime_type=doc_info.get("mime_type", ""),
+            filename=doc_info.get("filename", "document"),
+        )
 
-    elif message_type == "document":
-        await _handle_document(message, sender, settings)
+    if message_type == "interactive":
+        interactive = message.get("interactive", {})
+        list_reply = interactive.get("list_reply", {})
+        if list_reply:
+            return ParsedMessage("list_reply", message_id, reply_id=list_reply.get("id", ""))
+        button_reply = interactive.get("button_reply", {})
+        if button_reply:
+            return ParsedMessage("button_reply", message_id, reply_id=button_reply.get("id", ""))
+        return ParsedMessage("interactive", message_id)
 
-    elif message_type == "interactive":
-        await _handle_interactive(message, sender, settings)
+    return ParsedMessage(message_type or "", message_id)
 
-    else:
-        await send_text_message(settings, sender, FALLBACK_BODY)
 
+# ── Main entry point ───────────────────────────────────────────────
 
-# ── Text message handler ──────────────────────────────────────────
+# sender → [lock, messages holding or waiting for it]. A sender's messages
+# are handled one at a time, in arrival order; entries go once idle.
+_sender_locks: Dict[str, list] = {}
 
-async def _handle_text(sender: str, text: str, settings: dict) -> None:
-    intent = detect_intent(text)
-    session = get_session(sender)
 
-    # If we're awaiting text input (page spec, password, watermark text, etc.)
-    if session.state == "awaiting_input":
-        await _handle_awaited_input(sender, text, settings)
+@asynccontextmanager
+async def _sender_turn(sender: str):
+    """Wait until no other message from sender is being handled."""
+    entry = _sender_locks.get(sender)
+    if entry is None:
+        entry = _sender_locks[sender] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _sender_locks[sender]
+
+
+async def handle_message(message: dict, sender: str, settings: dict) -> None:
+    """Main message handler."""
+    msg = parse_message(message)
+    if msg.kind in IGNORED_MESSAGE_TYPES:
         return
 
-    if intent == Intent.GREETING:
-        await _send_feature_menu(sender, settings)
+    async with _sender_turn(sender):
+        if msg.message_id:
+            await send_in_background(send_typing_indicator, settings, sender, msg.message_id)
 
-    elif intent == Intent.HELP:
-        await send_text_message(settings, sender, HELP_TEXT)
-        await _send_more_features_menu(sender, settings)
+        handler = MESSAGE_HANDLERS.get(msg.kind, _handle_unsupported)
+        await handler(msg, sender, settings)
 
-    elif intent == Intent.CANCEL:
-        clear_session(sender)
-        await send_text_message(settings, sender, CANCEL_TEXT)
 
-    elif intent == Intent.DONE:
-        await _handle_done(sender, settings)
+async def handle_messages(messages: Iterable[dict], settings: dict) -> None:
+    """
+    Handle every message in a webhook delivery, up to MESSAGE_CONCURRENCY
+    at a time. Different senders progress in parallel; each sender's
+    messages still run in order. A failing message is logged and doesn't
+    stop the others.
+    """
+    semaphore = asyncio.Semaphore(MESSAGE_CONCURRENCY)
 
-    elif intent == Intent.STATUS:
-        await _handle_status(sender, settings)
+    async def _handle(message: dict) -> None:
+        async with semaphore:
+            await handle_message(message, message.get("from"), settings)
 
-    # Features that need a file sent next
-    elif intent == Intent.COMPRESS:
-        update_session(sender, state="idle", intent="compress", images=[])
-        await send_text_message(settings, sender, COMPRESS_READY_TEXT)
+    messages = list(messages)
+    results = await asyncio.gather(*(_handle(m) for m in messages), return_exceptions=True)
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error handling message {message.get('id')}: {result}")
 
-    elif intent == Intent.MERGE:
-        update_session(sender, state="collecting_images", intent="merge", images=[])
-        await send_text_message(settings, sender, MERGE_STARTED_TEXT)
 
-    elif intent == Intent.CONVERT:
-        update_session(sender, intent="convert")
-        await send_text_message(settings, sender, "Send me the image you'd like to convert to PDF.")
+# ── Background message workers ─────────────────────────────────────
 
-    elif intent == Intent.ROTATE:
-        update_session(sender, intent="rotate")
-        await send_button_message(settings, sender, "Choose rotation angle:", [
-            {"id": "btn_rotate_90", "title": "90°"},
-            {"id": "btn_rotate_180", "title": "180°"},
-            {"id": "btn_rotate_270", "title": "270°"},
-        ])
+# Set while run_message_workers() is running; enqueue_messages() then
+# hands messages to the workers so the webhook can be acknowledged at once.
+_message_queue: Optional[asyncio.Queue] = None
 
-    elif intent == Intent.SPLIT:
-        update_session(sender, intent="split")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+# message ID → time first seen, oldest first
+_seen_message_ids: "OrderedDict[str, float]" = OrderedDict()
 
-    elif intent == Intent.REORDER:
-        update_session(sender, intent="reorder")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
 
-    elif intent == Intent.LOCK_PDF:
-        update_session(sender, intent="lock_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+def _is_redelivery(message_id: Optional[str]) -> bool:
+    """Record message_id and report whether it was already seen recently."""
+    if not message_id:
+        return False
 
-    elif intent == Intent.UNLOCK_PDF:
-        update_session(sender, intent="unlock_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+    now = time.time()
+    cutoff = now - MESSAGE_DEDUP_TTL
+    while _seen_message_ids and (
+        len(_seen_message_ids) >= MESSAGE_DEDUP_MAX or next(iter(_seen_message_ids.values())) < cutoff
+    ):
+        _seen_message_ids.popitem(last=False)
 
-    elif intent == Intent.OCR:
-        update_session(sender, intent="ocr")
-        await send_text_message(settings, sender, "Send me an image or PDF to extract text from.")
+    if message_id in _seen_message_ids:
+        return True
+    _seen_message_ids[message_id] = now
+    return False
 
-    elif intent == Intent.PAGE_NUMBERS:
-        update_session(sender, intent="page_numbers")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
 
-    elif intent == Intent.WATERMARK:
-        update_session(sender, intent="watermark")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+async def enqueue_messages(messages: Iterable[dict], settings: dict) -> None:
+    """
+    Queue webhook messages for the background workers, dropping ones
+    already received. Handled inline when the workers aren't running;
+    waits for room when the queue is full.
+    """
+    messages = [m for m in messages if not _is_redelivery(m.get("id"))]
+    if _message_queue is None:
+        await handle_messages(messages, settings)
+        return
 
-    elif intent == Intent.SIGN_PDF:
-        update_session(sender, intent="sign_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+    queue = _message_queue
+    for i, message in enumerate(messages):
+        try:
+            await queue.put((message, settings))
+        except BaseException:
+            # Not queued after all: forget the IDs so Meta's retry is handled
+            for unqueued in messages[i:]:
+                _seen_message_ids.pop(unqueued.get("id"), None)
+            raise
+
+
+async def _message_worker(queue: asyncio.Queue, backlogs: Dict[str, Deque[tuple]]) -> None:
+    """
+    Handle queued messages. A message whose sender is already being handled
+    by another worker joins that sender's backlog instead of waiting for it,
+    so one busy sender can't tie up every worker; the owning worker works
+    through the backlog in arrival order before taking new messages.
+    """
+    while True:
+        item = await queue.get()
+        sender = item[0].get("from")
+        if sender in backlogs:
+            backlogs[sender].append(item)
+            continue
+
+        backlog = backlogs[sender] = deque([item])
+        while backlog:
+            message, settings = backlog[0]
+            try:
+                await handle_message(message, sender, settings)
+            except Exception as e:
+                logger.error(f"Error handling message {message.get('id')}: {e}")
+            finally:
+                backlog.popleft()
+                queue.task_done()
+        del backlogs[sender]
+
+
+async def run_message_workers() -> None:
+    """
+    Handle queued messages with MESSAGE_CONCURRENCY workers until cancelled.
+    Call drain_message_queue() first so nothing queued or in progress is cut off.
+    """
+    global _message_queue
+    queue = _message_queue = asyncio.Queue(maxsize=MESSAGE_QUEUE_SIZE)
+    # sender → messages waiting for the worker already handling that sender
+    backlogs: Dict[str, Deque[tuple]] = {}
 
-    elif intent == Intent.ENHANCE:
-        update_session(sender, intent="enhance")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("image_required"))
+    try:
+        await asyncio.gather(*(_message_worker(queue, backlogs) for _ in range(MESSAGE_CONCURRENCY)))
+    finally:
+        if _message_queue is queue:
+            _message_queue = None
+        unhandled = queue.qsize() + sum(len(backlog) for backlog in backlogs.values())
+        if unhandled:
+            logger.warning(f"Message workers stopped with {unhandled} messages unhandled")
+
+
+async def drain_message_queue(timeout: float = MESSAGE_DRAIN_TIMEOUT) -> bool:
+    """
+    Stop queueing new messages and wait up to timeout for the workers to
+    finish the ones already queued or in progress.
+    Returns False if they didn't finish in time.
+    """
+    global _message_queue
+    queue, _message_queue = _message_queue, None
+    if queue is None:
+        return True
 
-    elif intent == Intent.REMOVE_BG:
-        update_session(sender, intent="remove_bg")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("image_required"))
+    try:
+        await asyncio.wait_for(queue.join(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Gave up waiting for {queue.qsize()} queued messages after {timeout}s")
+        return False
 
-    elif intent == Intent.PDF_ARCHIVE:
-        update_session(sender, intent="pdf_archive")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
 
-    # Conversion intents
-    elif intent in (Intent.PDF_TO_WORD, Intent.PDF_TO_IMAGE, Intent.PDF_TO_PPT, Intent.PDF_TO_EXCEL):
-        update_session(sender, intent=intent.value)
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
+async def _handle_unsupported(msg: ParsedMessage, sender: str, settings: dict) -> None:
+    await send_text_message(settings, sender, FALLBACK_BODY)
 
-    elif intent in (Intent.WORD_TO_PDF, Intent.EXCEL_TO_PDF, Intent.PPT_TO_PDF):
-        update_session(sender, intent=intent.value)
-        await send_text_message(settings, sender, "Send me the document file to convert to PDF.")
 
-    else:
-        await send_text_message(settings, sender, FALLBACK_BODY)
+# ── Text message handler ──────────────────────────────────────────
+
+async def _handle_text(msg: ParsedMessage, sender: str, settings: dict) -> None:
+    text = msg.text
+    session = get_session(sender)
+
+    # If we're awaiting text input (page spec, password, watermark text, etc.)
+    if session.state == "awaiting_input":
+        await _handle_awaited_input(sender, session, text, settings)
+        return
+
+    intent = detect_intent(text)
+
+    await _dispatch_intent(sender, intent, settings, unknown_text=FALLBACK_BODY)
+
+    if intent == Intent.HELP:
+        # Typed "help" also gets the second page of the menu
+        await _send_more_features_menu(sender, settings)
 
 
 # ── Image message handler ─────────────────────────────────────────
 
-async def _handle_image(message: dict, sender: str, settings: dict) -> None:
+async def _handle_image(msg: ParsedMessage, sender: str, settings: dict) -> None:
     session = get_session(sender)
-    image_info = message.get("image", {})
-    media_id = image_info.get("id")
-    mime_type = image_info.get("mime_type", "image/jpeg")
-    caption = image_info.get("caption")
+    media_id = msg.media_id
+    mime_type = msg.mime_type
+    caption = msg.text
 
     if not media_id:
         await send_text_message(settings, sender, "Could not read the image. Please try again.")
         return
 
-    caption_intent = detect_intent_from_caption(caption)
+    # Most images arrive without a caption
+    caption_intent = detect_intent_from_caption(caption) if caption else None
+    collecting = session.state == "collecting_images"
+    intent = session.intent
 
     # Start merge mode from caption
-    if caption_intent == Intent.MERGE and session.state != "collecting_images":
-        update_session(sender, state="collecting_images", intent="merge", images=[])
+    if caption_intent == Intent.MERGE and not collecting:
+        reset_session(sender, "collecting_images", "merge")
         add_image_to_session(sender, media_id, mime_type)
         await send_text_message(settings, sender, "Image 1 added. Send more, then type *done* to merge.")
         return
 
     # Collecting images for merge
-    if session.state == "collecting_images":
-        add_image_to_session(sender, media_id, mime_type)
-        n = session.image_count
+    if collecting:
+        if session.image_count >= MAX_SESSION_IMAGES:
+            await send_text_message(settings, sender, MERGE_FULL_TEXT)
+            return
+        n = add_image_to_session(sender, media_id, mime_type).image_count
         await send_text_message(settings, sender, f"Image {n} added. Send more or type *done* to merge.")
         return
 
     # OCR on image
-    if session.intent == "ocr":
+    if intent == "ocr":
         await _process_ocr_image(sender, media_id, settings)
         return
 
     # Enhance image
-    if session.intent == "enhance":
+    if intent == "enhance":
         await _process_enhance(sender, media_id, settings)
         return
 
     # Remove background
-    if session.intent == "remove_bg":
+    if intent == "remove_bg":
         await _process_remove_bg(sender, media_id, settings)
         return
 
     # Sign PDF — user is sending signature image
-    if session.intent == "sign_pdf" and session.has_pdf:
+    if intent == "sign_pdf" and session.has_pdf:
         await _process_sign_pdf(sender, media_id, settings)
         return
 
     # Default: compress or convert to PDF
-    compress = session.intent == "compress" or caption_intent == Intent.COMPRESS
+    compress = intent == "compress" or caption_intent == Intent.COMPRESS
     await _process_single_image(sender, media_id, mime_type, compress, settings)
     clear_session(sender)
 
 
 # ── Document message handler ──────────────────────────────────────
 
-async def _handle_document(message: dict, sender: str, settings: dict) -> None:
+async def _handle_document(msg: ParsedMessage, sender: str, settings: dict) -> None:
     """Handle incoming document files (PDF, Word, Excel, PPT)."""
     session = get_session(sender)
-    doc_info = message.get("document", {})
-    media_id = doc_info.get("id")
-    mime_type = doc_info.get("mime_type", "")
-    filename = doc_info.get("filename", "document")
+    media_id = msg.media_id
+    mime_type = msg.mime_type
+    filename = msg.filename
 
     if not media_id:
         await send_text_message(settings, sender, "Could not read the document. Please try again.")
@@ -349,7 +531,9 @@ async def _handle_document(message: dict, sender: str, settings: dict) -> None:
 
     # If collecting for merge, add to collection
     if session.state == "collecting_images":
-        if is_pdf:
+        if session.image_count >= MAX_SESSION_IMAGES:
+            await send_text_message(settings, sender, MERGE_FULL_TEXT)
+        elif is_pdf:
             add_image_to_session(sender, media_id, "application/pdf")
             n = session.image_count
             await send_text_message(settings, sender, f"PDF added ({n} files total). Send more or type *done*.")
@@ -360,19 +544,18 @@ async def _handle_document(message: dict, sender: str, settings: dict) -> None:
     # Download the document
     start_time = time.time()
     try:
-        file_data = await download_media(settings, media_id)
+        file_data = await download_media(settings, media_id, max_bytes=MAX_FILE_SIZE)
+    except MediaTooLargeError:
+        await send_text_message(settings, sender, ErrorMessages.bilingual("file_too_large", limit="10 MB"))
+        return
     except Exception as e:
         logger.error(f"Failed to download document: {e}")
         await send_text_message(settings, sender, ErrorMessages.bilingual("network_error"))
         return
 
-    if len(file_data) > MAX_FILE_SIZE:
-        await send_text_message(settings, sender, ErrorMessages.bilingual("file_too_large", limit="10 MB"))
-        return
-
     # Handle PDF input
     if is_pdf:
-        await _handle_pdf_input(sender, file_data, filename, settings, start_time)
+        await _handle_pdf_input(sender, session, file_data, filename, settings, start_time)
         return
 
     # Handle Office document → convert to PDF
@@ -383,9 +566,10 @@ async def _handle_document(message: dict, sender: str, settings: dict) -> None:
     await send_text_message(settings, sender, ErrorMessages.bilingual("unsupported_format", expected="PDF, Word, Excel, or PPT"))
 
 
-async def _handle_pdf_input(sender: str, pdf_data: bytes, filename: str, settings: dict, start_time: float) -> None:
+async def _handle_pdf_input(
+    sender: str, session: Session, pdf_data: bytes, filename: str, settings: dict, start_time: float,
+) -> None:
     """Process a PDF based on current session intent."""
-    session = get_session(sender)
     intent = session.intent
 
     # If no specific intent, store PDF and ask what to do
@@ -420,29 +604,21 @@ async def _handle_pdf_input(sender: str, pdf_data: bytes, filename: str, setting
         return
 
     # Intents that can process immediately
-    if intent == "rotate":
+    if intent in PDF_CONVERSION_INTENTS:
+        await _process_conversion(sender, pdf_data, filename, intent, settings, start_time)
+    elif intent in PLAIN_PDF_TOOL_INTENTS:
+        await _process_pdf_tool(sender, pdf_data, filename, intent, settings, start_time)
+    elif intent == "rotate":
         angle = session.rotation_angle or 90
         await _process_pdf_tool(sender, pdf_data, filename, "rotate", settings, start_time, angle=angle)
     elif intent == "compress":
         quality = session.compress_quality or "medium"
         await _process_pdf_tool(sender, pdf_data, filename, "compress", settings, start_time, quality=quality)
-    elif intent == "page_numbers":
-        await _process_pdf_tool(sender, pdf_data, filename, "page_numbers", settings, start_time)
     elif intent == "sign_pdf":
         update_session(sender, pdf_data=pdf_data, pdf_filename=filename)
         await send_text_message(settings, sender, "PDF received. Now send me your signature image.")
-    elif intent == "pdf_archive":
-        await _process_pdf_tool(sender, pdf_data, filename, "pdf_archive", settings, start_time)
     elif intent == "ocr":
         await _process_ocr_pdf(sender, pdf_data, settings, start_time)
-    elif intent == "pdf_to_word":
-        await _process_conversion(sender, pdf_data, filename, "pdf_to_word", settings, start_time)
-    elif intent == "pdf_to_image":
-        await _process_conversion(sender, pdf_data, filename, "pdf_to_image", settings, start_time)
-    elif intent == "pdf_to_ppt":
-        await _process_conversion(sender, pdf_data, filename, "pdf_to_ppt", settings, start_time)
-    elif intent == "pdf_to_excel":
-        await _process_conversion(sender, pdf_data, filename, "pdf_to_excel", settings, start_time)
     else:
         await send_text_message(settings, sender, ErrorMessages.bilingual("processing_failed"))
 
@@ -451,19 +627,18 @@ async def _handle_office_input(sender: str, file_data: bytes, filename: str, mim
     """Convert Office document to PDF."""
     from utils.pdf_converter import office_to_pdf
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     ext = filename.rsplit(".", 1)[-1] if "." in filename else "docx"
 
     try:
         log_conversion(conversion_id, sender, "pending", len(file_data), feature="office_to_pdf", input_type=ext)
         await send_text_message(settings, sender, f"Converting {filename} to PDF...")
 
-        pdf_data = office_to_pdf(file_data, ext)
+        pdf_data = await run_cpu_bound(office_to_pdf, file_data, ext)
         elapsed = int((time.time() - start_time) * 1000)
 
-        pdf_media_id = await upload_media(settings, pdf_data, "application/pdf")
         out_name = filename.rsplit(".", 1)[0] + ".pdf"
-        await send_document_message(settings, sender, pdf_media_id, filename=out_name, caption="Here's your PDF!")
+        await _deliver_document(settings, sender, pdf_data, "application/pdf", out_name, "Here's your PDF!")
 
         log_conversion(conversion_id, sender, "success", len(file_data),
                        feature="office_to_pdf", input_type=ext, output_type="pdf",
@@ -480,44 +655,23 @@ async def _handle_office_input(sender: str, file_data: bytes, filename: str, mim
 
 # ── Interactive message handler ───────────────────────────────────
 
-async def _handle_interactive(message: dict, sender: str, settings: dict) -> None:
-    interactive = message.get("interactive", {})
-
-    # Handle list replies
-    list_reply = interactive.get("list_reply", {})
-    if list_reply:
-        list_id = list_reply.get("id", "")
-        intent = detect_intent_from_list(list_id)
-        if intent != Intent.UNKNOWN:
-            # Re-dispatch as text intent
-            await _dispatch_intent(sender, intent, settings)
-            return
+async def _handle_list_reply(msg: ParsedMessage, sender: str, settings: dict) -> None:
+    intent = detect_intent_from_list(msg.reply_id)
+    await _dispatch_intent(sender, intent, settings)
 
-    # Handle button replies
-    button_reply = interactive.get("button_reply", {})
-    if button_reply:
-        button_id = button_reply.get("id", "")
-        await _handle_button_reply(sender, button_id, settings)
-        return
 
+async def _handle_bare_interactive(msg: ParsedMessage, sender: str, settings: dict) -> None:
+    # An interactive message with neither a list nor a button reply
     await send_text_message(settings, sender, HELP_TEXT)
 
 
-async def _handle_button_reply(sender: str, button_id: str, settings: dict) -> None:
-    session = get_session(sender)
-
-    # Rotation angle buttons
-    if button_id.startswith("btn_rotate_"):
-        angle = int(button_id.replace("btn_rotate_", ""))
-        update_session(sender, intent="rotate", rotation_angle=angle)
-        await send_text_message(settings, sender, f"Rotation set to {angle}°. Now send me the PDF.")
-        return
-
-    # Compression quality buttons
-    if button_id.startswith("btn_quality_"):
-        quality = button_id.replace("btn_quality_", "")
-        update_session(sender, intent="compress", compress_quality=quality)
-        await send_text_message(settings, sender, f"Quality set to {quality}. Now send me the PDF or image.")
+async def _handle_button_reply(msg: ParsedMessage, sender: str, settings: dict) -> None:
+    button_id = msg.reply_id
+    # Parameterised buttons ("btn_rotate_90", "btn_quality_low") carry their value last
+    prefix, _, value = button_id.rpartition("_")
+    handler = BUTTON_HANDLERS.get(prefix)
+    if handler is not None:
+        await handler(sender, value, settings)
         return
 
     # Standard button intents
@@ -525,85 +679,153 @@ async def _handle_button_reply(sender: str, button_id: str, settings: dict) -> N
     await _dispatch_intent(sender, intent, settings)
 
 
-async def _dispatch_intent(sender: str, intent: Intent, settings: dict) -> None:
-    """Dispatch an intent from button/list reply to the appropriate handler."""
-    if intent == Intent.CONVERT:
-        update_session(sender, intent="convert")
-        await send_text_message(settings, sender, "Send me the image to convert to PDF.")
-    elif intent == Intent.COMPRESS:
-        update_session(sender, state="idle", intent="compress", images=[])
-        await send_text_message(settings, sender, COMPRESS_READY_TEXT)
-    elif intent == Intent.MERGE:
-        update_session(sender, state="collecting_images", intent="merge", images=[])
-        await send_text_message(settings, sender, MERGE_STARTED_TEXT)
-    elif intent == Intent.HELP:
-        await send_text_message(settings, sender, HELP_TEXT)
-    elif intent == Intent.UNKNOWN:
-        await send_text_message(settings, sender, HELP_TEXT)
-    elif intent == Intent.ROTATE:
-        update_session(sender, intent="rotate")
-        await send_button_message(settings, sender, "Choose rotation angle:", [
-            {"id": "btn_rotate_90", "title": "90°"},
-            {"id": "btn_rotate_180", "title": "180°"},
-            {"id": "btn_rotate_270", "title": "270°"},
-        ])
-    elif intent == Intent.SPLIT:
-        update_session(sender, intent="split")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.REORDER:
-        update_session(sender, intent="reorder")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.LOCK_PDF:
-        update_session(sender, intent="lock_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.UNLOCK_PDF:
-        update_session(sender, intent="unlock_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.OCR:
-        update_session(sender, intent="ocr")
-        await send_text_message(settings, sender, "Send me an image or PDF to extract text from.")
-    elif intent == Intent.PAGE_NUMBERS:
-        update_session(sender, intent="page_numbers")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.WATERMARK:
-        update_session(sender, intent="watermark")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.SIGN_PDF:
-        update_session(sender, intent="sign_pdf")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent == Intent.ENHANCE:
-        update_session(sender, intent="enhance")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("image_required"))
-    elif intent == Intent.REMOVE_BG:
-        update_session(sender, intent="remove_bg")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("image_required"))
-    elif intent == Intent.PDF_ARCHIVE:
-        update_session(sender, intent="pdf_archive")
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent in (Intent.PDF_TO_WORD, Intent.PDF_TO_IMAGE, Intent.PDF_TO_PPT, Intent.PDF_TO_EXCEL):
-        update_session(sender, intent=intent.value)
-        await send_text_message(settings, sender, ErrorMessages.bilingual("send_pdf_first"))
-    elif intent in (Intent.WORD_TO_PDF, Intent.EXCEL_TO_PDF, Intent.PPT_TO_PDF):
-        update_session(sender, intent=intent.value)
-        await send_text_message(settings, sender, "Send me the document file to convert to PDF.")
-    elif intent == Intent.GREETING:
-        await _send_feature_menu(sender, settings)
-    elif intent == Intent.CANCEL:
-        clear_session(sender)
-        await send_text_message(settings, sender, CANCEL_TEXT)
-    elif intent == Intent.DONE:
-        await _handle_done(sender, settings)
-    elif intent == Intent.STATUS:
-        await _handle_status(sender, settings)
-    else:
-        await send_text_message(settings, sender, FALLBACK_BODY)
+async def _on_rotate_button(sender: str, value: str, settings: dict) -> None:
+    angle = int(value)
+    update_session(sender, intent="rotate", rotation_angle=angle)
+    await send_text_message(settings, sender, f"Rotation set to {angle}°. Now send me the PDF.")
+
+
+async def _on_quality_button(sender: str, value: str, settings: dict) -> None:
+    update_session(sender, intent="compress", compress_quality=value)
+    await send_text_message(settings, sender, f"Quality set to {value}. Now send me the PDF or image.")
+
+
+BUTTON_HANDLERS: Dict[str, Callable[[str, str, dict], Awaitable[None]]] = {
+    "btn_rotate": _on_rotate_button,
+    "btn_quality": _on_quality_button,
+}
+
+# ParsedMessage.kind → handler; other kinds get FALLBACK_BODY
+MESSAGE_HANDLERS: Dict[str, Callable[[ParsedMessage, str, dict], Awaitable[None]]] = {
+    "text": _handle_text,
+    "image": _handle_image,
+    "document": _handle_document,
+    "list_reply": _handle_list_reply,
+    "button_reply": _handle_button_reply,
+    "interactive": _handle_bare_interactive,
+}
+
+
+async def _dispatch_intent(sender: str, intent: Intent, settings: dict, unknown_text: str = HELP_TEXT) -> None:
+    """Dispatch an intent from a text, button or list reply to its registered handler."""
+    handler = INTENT_HANDLERS.get(intent)
+    if handler is None:
+        await send_text_message(settings, sender, unknown_text)
+        return
+    await handler(sender, intent, settings)
+
+
+# ── Intent handlers ───────────────────────────────────────────────
+
+IntentHandler = Callable[[str, Intent, dict], Awaitable[None]]
+
+# One entry per Intent, filled in by @_on_intent below
+INTENT_HANDLERS: Dict[Intent, IntentHandler] = {}
+
+
+def _on_intent(*intents: Intent) -> Callable[[IntentHandler], IntentHandler]:
+    """Register the decorated coroutine as the handler for the given intents."""
+    def register(handler: IntentHandler) -> IntentHandler:
+        for intent in intents:
+            INTENT_HANDLERS[intent] = handler
+        return handler
+    return register
+
+
+# Features that just record the intent and wait for a file
+FILE_PROMPTS: Dict[Intent, str] = {
+    Intent.CONVERT: "Send me the image you'd like to convert to PDF.",
+    Intent.OCR: "Send me an image or PDF to extract text from.",
+    Intent.SPLIT: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.REORDER: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.LOCK_PDF: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.UNLOCK_PDF: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PAGE_NUMBERS: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.WATERMARK: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.SIGN_PDF: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PDF_ARCHIVE: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PDF_TO_WORD: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PDF_TO_IMAGE: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PDF_TO_PPT: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.PDF_TO_EXCEL: ErrorMessages.bilingual("send_pdf_first"),
+    Intent.ENHANCE: ErrorMessages.bilingual("image_required"),
+    Intent.REMOVE_BG: ErrorMessages.bilingual("image_required"),
+    Intent.WORD_TO_PDF: "Send me the document file to convert to PDF.",
+    Intent.EXCEL_TO_PDF: "Send me the document file to convert to PDF.",
+    Intent.PPT_TO_PDF: "Send me the document file to convert to PDF.",
+}
+
+
+def apply_intent(intent: Intent, sender: str) -> Session:
+    """
+    Apply the session changes an intent makes, without sending anything.
+    The intent handlers below call this before replying.
+    """
+    if intent == Intent.COMPRESS:
+        return reset_session(sender, "idle", "compress")
+    if intent == Intent.MERGE:
+        return reset_session(sender, "collecting_images", "merge")
+    if intent == Intent.CANCEL:
+        return clear_session(sender)
+    if intent == Intent.ROTATE or intent in FILE_PROMPTS:
+        return update_session(sender, intent=intent.value)
+    return get_session(sender)
+
+
+@_on_intent(*FILE_PROMPTS)
+async def _prompt_for_file(sender: str, intent: Intent, settings: dict) -> None:
+    apply_intent(intent, sender)
+    await send_text_message(settings, sender, FILE_PROMPTS[intent])
+
+
+@_on_intent(Intent.GREETING)
+async def _on_greeting(sender: str, intent: Intent, settings: dict) -> None:
+    await _send_feature_menu(sender, settings)
+
+
+@_on_intent(Intent.HELP)
+async def _on_help(sender: str, intent: Intent, settings: dict) -> None:
+    await send_text_message(settings, sender, HELP_TEXT)
+
+
+@_on_intent(Intent.CANCEL)
+async def _on_cancel(sender: str, intent: Intent, settings: dict) -> None:
+    apply_intent(intent, sender)
+    await send_text_message(settings, sender, CANCEL_TEXT)
+
+
+@_on_intent(Intent.DONE)
+async def _on_done(sender: str, intent: Intent, settings: dict) -> None:
+    await _handle_done(sender, settings)
+
+
+@_on_intent(Intent.STATUS)
+async def _on_status(sender: str, intent: Intent, settings: dict) -> None:
+    await _handle_status(sender, settings)
+
+
+@_on_intent(Intent.COMPRESS)
+async def _on_compress(sender: str, intent: Intent, settings: dict) -> None:
+    apply_intent(intent, sender)
+    await send_text_message(settings, sender, COMPRESS_READY_TEXT)
+
+
+@_on_intent(Intent.MERGE)
+async def _on_merge(sender: str, intent: Intent, settings: dict) -> None:
+    apply_intent(intent, sender)
+    await send_text_message(settings, sender, MERGE_STARTED_TEXT)
+
+
+@_on_intent(Intent.ROTATE)
+async def _on_rotate(sender: str, intent: Intent, settings: dict) -> None:
+    apply_intent(intent, sender)
+    await send_button_message(settings, sender, "Choose rotation angle:", ROTATE_BUTTONS)
 
 
 # ── Awaited input handler ─────────────────────────────────────────
 
-async def _handle_awaited_input(sender: str, text: str, settings: dict) -> None:
+async def _handle_awaited_input(sender: str, session: Session, text: str, settings: dict) -> None:
     """Handle text input when we're waiting for page spec, password, or watermark text."""
-    session = get_session(sender)
     intent = session.intent
 
     # Allow cancel even while awaiting input
@@ -612,30 +834,16 @@ async def _handle_awaited_input(sender: str, text: str, settings: dict) -> None:
         await send_text_message(settings, sender, CANCEL_TEXT)
         return
 
-    start_time = time.time()
-
-    if intent == "split":
-        update_session(sender, page_spec=text)
-        await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, "split", settings, start_time, page_spec=text)
-
-    elif intent == "reorder":
-        update_session(sender, page_spec=text)
-        await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, "reorder", settings, start_time, order_spec=text)
-
-    elif intent == "lock_pdf":
-        update_session(sender, pdf_password=text)
-        await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, "lock_pdf", settings, start_time, password=text)
-
-    elif intent == "unlock_pdf":
-        update_session(sender, pdf_password=text)
-        await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, "unlock_pdf", settings, start_time, password=text)
-
-    elif intent == "watermark":
-        update_session(sender, watermark_text=text)
-        await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, "watermark", settings, start_time, watermark_text=text)
-
-    else:
+    awaited = AWAITED_TEXT_INPUTS.get(intent)
+    if awaited is None:
         await send_text_message(settings, sender, "I wasn't expecting text input right now. Type *cancel* to start over.")
+        return
+
+    session_field, tool_kwarg = awaited
+    start_time = time.time()
+    update_session(sender, **{session_field: text})
+    await _process_pdf_tool(sender, session.pdf_data, session.pdf_filename, intent, settings, start_time,
+                            **{tool_kwarg: text})
 
 
 # ── Done / Status handlers ────────────────────────────────────────
@@ -643,7 +851,7 @@ async def _handle_awaited_input(sender: str, text: str, settings: dict) -> None:
 async def _handle_done(sender: str, settings: dict) -> None:
     session = get_session(sender)
     if session.state == "collecting_images" and session.image_count > 0:
-        await _process_merge(sender, settings)
+        await _process_merge(sender, session, settings)
     elif session.state == "collecting_images":
         await send_text_message(settings, sender, "You haven't sent any files yet. Send images/PDFs first, then type *done*.")
     else:
@@ -691,29 +899,27 @@ async def _process_single_image(
     sender: str, media_id: str, mime_type: str, compress: bool, settings: dict
 ) -> None:
     """Download a single image, convert to PDF, and send back."""
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
         log_conversion(conversion_id, sender, "pending", 0, feature="compress" if compress else "convert")
 
-        image_data = await download_media(settings, media_id)
-        file_size = len(image_data)
-
-        if file_size > MAX_FILE_SIZE:
+        try:
+            image_data = await download_media(settings, media_id, max_bytes=MAX_FILE_SIZE)
+        except MediaTooLargeError as e:
             await send_text_message(settings, sender, ErrorMessages.bilingual("file_too_large", limit="10 MB"))
-            log_conversion(conversion_id, sender, "failed", file_size, error_message="File too large")
+            log_conversion(conversion_id, sender, "failed", e.size, error_message="File too large")
             return
+        file_size = len(image_data)
 
-        pdf_data = convert_image_to_pdf(image_data, mime_type, compress=compress)
+        pdf_data = await run_cpu_bound(convert_image_to_pdf, image_data, mime_type, compress=compress)
         elapsed = int((time.time() - start_time) * 1000)
 
-        pdf_media_id = await upload_media(settings, pdf_data, "application/pdf")
-
         label = "compressed_" if compress else "converted_"
-        filename = f"{label}{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filename = f"{label}{_file_timestamp()}.pdf"
         caption = "Compressed PDF" if compress else "Here's your PDF!"
-        await send_document_message(settings, sender, pdf_media_id, filename=filename, caption=caption)
+        await _deliver_document(settings, sender, pdf_data, "application/pdf", filename, caption)
 
         log_conversion(conversion_id, sender, "success", file_size,
                        feature="compress" if compress else "convert",
@@ -730,10 +936,9 @@ async def _process_single_image(
             pass
 
 
-async def _process_merge(sender: str, settings: dict) -> None:
+async def _process_merge(sender: str, session: Session, settings: dict) -> None:
     """Download all collected files, merge into one PDF, and send back."""
-    session = get_session(sender)
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
@@ -742,37 +947,32 @@ async def _process_merge(sender: str, settings: dict) -> None:
 
         await send_text_message(settings, sender, f"Merging {session.image_count} files, please wait...")
 
-        files: List[Tuple[bytes, str]] = []
-        total_size = 0
-
-        for img_ref in session.images:
-            data = await download_media(settings, img_ref["media_id"])
-            total_size += len(data)
-            files.append((data, img_ref["mime_type"]))
-
-        if total_size > MAX_FILE_SIZE * 5:
+        refs = session.images
+        try:
+            blobs = await _download_all(settings, [ref["media_id"] for ref in refs], max_total_bytes=MAX_MERGE_BYTES)
+        except _DownloadBudgetExceeded as e:
             await send_text_message(settings, sender, ErrorMessages.bilingual("file_too_large", limit="50 MB total"))
-            log_conversion(conversion_id, sender, "failed", total_size, feature="merge", error_message="Total size too large")
+            log_conversion(conversion_id, sender, "failed", e.total_size, feature="merge", error_message="Total size too large")
             clear_session(sender)
             return
 
+        files: List[Tuple[bytes, str]] = [(data, ref["mime_type"]) for data, ref in zip(blobs, refs)]
+        total_size = sum(len(data) for data in blobs)
+
         # Check if any PDFs in the mix
         has_pdfs = any(mt == "application/pdf" for _, mt in files)
 
         if has_pdfs:
             from utils.pdf_converter import merge_mixed
-            pdf_data = merge_mixed(files)
+            pdf_data = await run_cpu_bound(merge_mixed, files)
         else:
-            image_list = [(data, mt) for data, mt in files]
-            pdf_data = merge_images_to_pdf(image_list)
+            pdf_data = await run_cpu_bound(merge_images_to_pdf, files)
 
         elapsed = int((time.time() - start_time) * 1000)
 
-        pdf_media_id = await upload_media(settings, pdf_data, "application/pdf")
-
-        filename = f"merged_{len(files)}files_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filename = f"merged_{len(files)}files_{_file_timestamp()}.pdf"
         caption = f"Merged PDF — {len(files)} files"
-        await send_document_message(settings, sender, pdf_media_id, filename=filename, caption=caption)
+        await _deliver_document(settings, sender, pdf_data, "application/pdf", filename, caption)
 
         log_conversion(conversion_id, sender, "success", total_size,
                        feature="merge", output_type="pdf",
@@ -798,56 +998,55 @@ async def _process_pdf_tool(
     """Apply a PDF tool and send the result back."""
     from utils import pdf_tools
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
 
     try:
         log_conversion(conversion_id, sender, "pending", len(pdf_data), feature=tool, input_type="pdf")
 
         if tool == "split":
-            result = pdf_tools.split_pdf(pdf_data, kwargs["page_spec"])
-            out_name = f"split_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.split_pdf, pdf_data, kwargs["page_spec"])
+            out_name = f"split_{_file_time()}.pdf"
             caption = "Here are your extracted pages!"
         elif tool == "rotate":
-            result = pdf_tools.rotate_pdf(pdf_data, kwargs.get("angle", 90))
-            out_name = f"rotated_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.rotate_pdf, pdf_data, kwargs.get("angle", 90))
+            out_name = f"rotated_{_file_time()}.pdf"
             caption = f"Rotated {kwargs.get('angle', 90)}°"
         elif tool == "reorder":
-            result = pdf_tools.reorder_pdf(pdf_data, kwargs["order_spec"])
-            out_name = f"reordered_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.reorder_pdf, pdf_data, kwargs["order_spec"])
+            out_name = f"reordered_{_file_time()}.pdf"
             caption = "Pages reordered!"
         elif tool == "lock_pdf":
-            result = pdf_tools.protect_pdf(pdf_data, kwargs["password"])
-            out_name = f"protected_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.protect_pdf, pdf_data, kwargs["password"])
+            out_name = f"protected_{_file_time()}.pdf"
             caption = "PDF is now password-protected!"
         elif tool == "unlock_pdf":
-            result = pdf_tools.unlock_pdf(pdf_data, kwargs["password"])
-            out_name = f"unlocked_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.unlock_pdf, pdf_data, kwargs["password"])
+            out_name = f"unlocked_{_file_time()}.pdf"
             caption = "PDF unlocked!"
         elif tool == "compress":
-            result = pdf_tools.compress_pdf(pdf_data, kwargs.get("quality", "medium"))
-            out_name = f"compressed_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.compress_pdf, pdf_data, kwargs.get("quality", "medium"))
+            out_name = f"compressed_{_file_time()}.pdf"
             orig_kb = len(pdf_data) // 1024
             new_kb = len(result) // 1024
             caption = f"Compressed: {orig_kb} KB → {new_kb} KB"
         elif tool == "page_numbers":
-            result = pdf_tools.add_page_numbers(pdf_data)
-            out_name = f"numbered_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.add_page_numbers, pdf_data)
+            out_name = f"numbered_{_file_time()}.pdf"
             caption = "Page numbers added!"
         elif tool == "watermark":
-            result = pdf_tools.add_watermark(pdf_data, kwargs["watermark_text"])
-            out_name = f"watermarked_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.add_watermark, pdf_data, kwargs["watermark_text"])
+            out_name = f"watermarked_{_file_time()}.pdf"
             caption = "Watermark added!"
         elif tool == "pdf_archive":
-            result = pdf_tools.make_pdf_archive(pdf_data)
-            out_name = f"archived_{datetime.now().strftime('%H%M%S')}.pdf"
+            result = await run_cpu_bound(pdf_tools.make_pdf_archive, pdf_data)
+            out_name = f"archived_{_file_time()}.pdf"
             caption = "PDF archived with metadata!"
         else:
             raise ValueError(f"Unknown tool: {tool}")
 
         elapsed = int((time.time() - start_time) * 1000)
 
-        media_id = await upload_media(settings, result, "application/pdf")
-        await send_document_message(settings, sender, media_id, filename=out_name, caption=caption)
+        await _deliver_document(settings, sender, result, "application/pdf", out_name, caption)
 
         log_conversion(conversion_id, sender, "success", len(pdf_data),
                        feature=tool, input_type="pdf", output_type="pdf",
@@ -873,41 +1072,38 @@ async def _process_conversion(
     """Convert PDF to another format and send back."""
     from utils import pdf_converter
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
 
     try:
         log_conversion(conversion_id, sender, "pending", len(pdf_data), feature=conversion_type, input_type="pdf")
         await send_text_message(settings, sender, "Converting, please wait...")
 
         if conversion_type == "pdf_to_word":
-            result = pdf_converter.pdf_to_word(pdf_data)
+            result = await run_cpu_bound(pdf_converter.pdf_to_word, pdf_data)
             out_name = filename.rsplit(".", 1)[0] + ".docx"
             mime = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             caption = "Here's your Word document!"
 
         elif conversion_type == "pdf_to_image":
-            images = pdf_converter.pdf_to_images(pdf_data)
+            pages = pdf_converter.pdf_to_images(pdf_data)
+            page_count = await _send_pdf_pages(settings, sender, pages)
             elapsed = int((time.time() - start_time) * 1000)
 
-            # Send each page as an image
-            for img_data, img_name in images:
-                img_media_id = await upload_media(settings, img_data, "image/jpeg", filename=img_name)
-                await send_image_message(settings, sender, img_media_id, caption=img_name)
-
             log_conversion(conversion_id, sender, "success", len(pdf_data),
                            feature=conversion_type, output_type="image",
                            processing_time_ms=elapsed)
+            logger.info(f"Sent {page_count} page images to {sender}")
             clear_session(sender)
             return
 
         elif conversion_type == "pdf_to_ppt":
-            result = pdf_converter.pdf_to_ppt(pdf_data)
+            result = await run_cpu_bound(pdf_converter.pdf_to_ppt, pdf_data)
             out_name = filename.rsplit(".", 1)[0] + ".pptx"
             mime = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
             caption = "Here's your PowerPoint!"
 
         elif conversion_type == "pdf_to_excel":
-            result = pdf_converter.pdf_to_excel(pdf_data)
+            result = await run_cpu_bound(pdf_converter.pdf_to_excel, pdf_data)
             out_name = filename.rsplit(".", 1)[0] + ".xlsx"
             mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             caption = "Here's your Excel file!"
@@ -917,8 +1113,7 @@ async def _process_conversion(
 
         elapsed = int((time.time() - start_time) * 1000)
 
-        media_id = await upload_media(settings, result, mime, filename=out_name)
-        await send_document_message(settings, sender, media_id, filename=out_name, caption=caption)
+        await _deliver_document(settings, sender, result, mime, out_name, caption)
 
         log_conversion(conversion_id, sender, "success", len(pdf_data),
                        feature=conversion_type, input_type="pdf", output_type=out_name.rsplit(".", 1)[-1],
@@ -937,14 +1132,14 @@ async def _process_ocr_image(sender: str, media_id: str, settings: dict) -> None
     """OCR on an image."""
     from utils.ocr import extract_text_from_image
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
         log_conversion(conversion_id, sender, "pending", 0, feature="ocr", input_type="image")
         image_data = await download_media(settings, media_id)
 
-        text = extract_text_from_image(image_data)
+        text = await run_cpu_bound(extract_text_from_image, image_data)
         elapsed = int((time.time() - start_time) * 1000)
 
         if text:
@@ -952,9 +1147,8 @@ async def _process_ocr_image(sender: str, media_id: str, settings: dict) -> None
                 # Send as text file
                 from utils.ocr import create_text_file
                 txt_data = create_text_file(text)
-                txt_media_id = await upload_media(settings, txt_data, "text/plain", filename="extracted_text.txt")
-                await send_document_message(settings, sender, txt_media_id,
-                                            filename="extracted_text.txt", caption=f"Extracted {len(text)} characters")
+                await _deliver_document(settings, sender, txt_data, "text/plain",
+                                        "extracted_text.txt", f"Extracted {len(text)} characters")
             else:
                 await send_text_message(settings, sender, f"*Extracted text:*\n\n{text}")
 
@@ -977,21 +1171,20 @@ async def _process_ocr_pdf(sender: str, pdf_data: bytes, settings: dict, start_t
     """OCR on a PDF."""
     from utils.ocr import extract_text_from_pdf, create_text_file
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
 
     try:
         log_conversion(conversion_id, sender, "pending", len(pdf_data), feature="ocr", input_type="pdf")
         await send_text_message(settings, sender, "Extracting text, please wait...")
 
-        text = extract_text_from_pdf(pdf_data)
+        text = await run_cpu_bound(extract_text_from_pdf, pdf_data)
         elapsed = int((time.time() - start_time) * 1000)
 
         if text:
             if len(text) > 4000:
                 txt_data = create_text_file(text)
-                txt_media_id = await upload_media(settings, txt_data, "text/plain", filename="extracted_text.txt")
-                await send_document_message(settings, sender, txt_media_id,
-                                            filename="extracted_text.txt", caption=f"Extracted {len(text)} characters")
+                await _deliver_document(settings, sender, txt_data, "text/plain",
+                                        "extracted_text.txt", f"Extracted {len(text)} characters")
             else:
                 await send_text_message(settings, sender, f"*Extracted text:*\n\n{text}")
 
@@ -1015,18 +1208,17 @@ async def _process_enhance(sender: str, media_id: str, settings: dict) -> None:
     """Enhance a document image."""
     from utils.image_tools import enhance_document
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
         log_conversion(conversion_id, sender, "pending", 0, feature="enhance", input_type="image")
         image_data = await download_media(settings, media_id)
 
-        enhanced = enhance_document(image_data)
+        enhanced = await run_cpu_bound(enhance_document, image_data)
         elapsed = int((time.time() - start_time) * 1000)
 
-        img_media_id = await upload_media(settings, enhanced, "image/png", filename="enhanced.png")
-        await send_image_message(settings, sender, img_media_id, caption="Enhanced image!")
+        await _deliver_image(settings, sender, enhanced, "image/png", "enhanced.png", "Enhanced image!")
 
         log_conversion(conversion_id, sender, "success", len(image_data),
                        feature="enhance", processing_time_ms=elapsed, output_file_size=len(enhanced))
@@ -1043,18 +1235,17 @@ async def _process_remove_bg(sender: str, media_id: str, settings: dict) -> None
     """Remove background from image."""
     from utils.image_tools import remove_background
 
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
         log_conversion(conversion_id, sender, "pending", 0, feature="remove_bg", input_type="image")
         image_data = await download_media(settings, media_id)
 
-        result = remove_background(image_data)
+        result = await run_cpu_bound(remove_background, image_data)
         elapsed = int((time.time() - start_time) * 1000)
 
-        img_media_id = await upload_media(settings, result, "image/png", filename="no_background.png")
-        await send_image_message(settings, sender, img_media_id, caption="Background removed!")
+        await _deliver_image(settings, sender, result, "image/png", "no_background.png", "Background removed!")
 
         log_conversion(conversion_id, sender, "success", len(image_data),
                        feature="remove_bg", processing_time_ms=elapsed, output_file_size=len(result))
@@ -1072,22 +1263,21 @@ async def _process_sign_pdf(sender: str, sig_media_id: str, settings: dict) -> N
     from utils.pdf_tools import sign_pdf
 
     session = get_session(sender)
-    conversion_id = str(uuid.uuid4())
+    conversion_id = _new_conversion_id()
     start_time = time.time()
 
     try:
-        log_conversion(conversion_id, sender, "pending", len(session.pdf_data), feature="sign_pdf")
+        pdf_data = session.pdf_data
+        log_conversion(conversion_id, sender, "pending", len(pdf_data), feature="sign_pdf")
 
         sig_data = await download_media(settings, sig_media_id)
-        result = sign_pdf(session.pdf_data, sig_data)
+        result = await run_cpu_bound(sign_pdf, pdf_data, sig_data)
         elapsed = int((time.time() - start_time) * 1000)
 
-        media_id = await upload_media(settings, result, "application/pdf")
-        await send_document_message(settings, sender, media_id,
-                                    filename=f"signed_{datetime.now().strftime('%H%M%S')}.pdf",
-                                    caption="Signature added!")
+        out_name = f"signed_{_file_time()}.pdf"
+        await _deliver_document(settings, sender, result, "application/pdf", out_name, "Signature added!")
 
-        log_conversion(conversion_id, sender, "success", len(session.pdf_data),
+        log_conversion(conversion_id, sender, "success", len(pdf_data),
                        feature="sign_pdf", processing_time_ms=elapsed, output_file_size=len(result))
 
     except Exception as e:
@@ -1100,6 +1290,140 @@ async def _process_sign_pdf(sender: str, sig_media_id: str, settings: dict) -> N
 
 # ── Helpers ────────────────────────────────────────────────────────
 
+# Output filename timestamp, reformatted at most once per second
+_timestamp_cache = {"second": 0, "value": ""}
+
+
+def _file_timestamp() -> str:
+    """Current local time as YYYYmmdd_HHMMSS, for output filenames."""
+    now = int(time.time())
+    if _timestamp_cache["second"] != now:
+        _timestamp_cache["second"] = now
+        _timestamp_cache["value"] = datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")
+    return _timestamp_cache["value"]
+
+
+def _file_time() -> str:
+    """Current local time as HHMMSS, for short output filenames."""
+    return _file_timestamp()[-6:]
+
+
+class _DownloadBudgetExceeded(Exception):
+    """Raised by _download_all() once the files fetched so far are too large."""
+
+    def __init__(self, total_size: int):
+        super().__init__(f"Downloaded {total_size} bytes, over budget")
+        self.total_size = total_size
+
+
+async def _download_all(
+    settings: dict, media_ids: List[str], max_total_bytes: Optional[int] = None,
+) -> List[bytes]:
+    """
+    Download several media files concurrently, returned in the given order.
+    The first failure cancels the downloads still pending; a merge can't
+    go ahead with a file missing anyway. So does the first download that
+    takes the running total past max_total_bytes.
+    """
+    semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+    total_size = 0
+
+    def _check_budget() -> None:
+        if max_total_bytes is not None and total_size > max_total_bytes:
+            raise _DownloadBudgetExceeded(total_size)
+
+    async def _download(media_id: str) -> bytes:
+        nonlocal total_size
+        async with semaphore:
+            _check_budget()
+            remaining = None if max_total_bytes is None else max_total_bytes - total_size
+            try:
+                data = await download_media(settings, media_id, max_bytes=remaining)
+            except MediaTooLargeError as e:
+                raise _DownloadBudgetExceeded(total_size + e.size) from None
+            total_size += len(data)
+            _check_budget()
+            return data
+
+    tasks = [asyncio.create_task(_download(media_id)) for media_id in media_ids]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def _deliver_document(
+    settings: dict, sender: str, data: bytes, mime_type: str, filename: str, caption: str,
+) -> None:
+    """Upload a result file and send it back as a document in one step."""
+    media_id = await upload_media(settings, data, mime_type, filename=filename)
+    await send_document_message(settings, sender, media_id, filename=filename, caption=caption)
+
+
+async def _deliver_image(
+    settings: dict, sender: str, data: bytes, mime_type: str, filename: str, caption: str,
+) -> None:
+    """Upload a result image and send it back as an image message in one step."""
+    media_id = await upload_media(settings, data, mime_type, filename=filename)
+    await send_image_message(settings, sender, media_id, caption=caption)
+
+
+async def _send_pdf_pages(settings: dict, sender: str, pages: Iterable[Tuple[bytes, str]]) -> int:
+    """
+    Upload rendered page images and send them in page order.
+    Pages are rendered on a worker thread while earlier pages upload, with at
+    most PAGE_UPLOAD_CONCURRENCY uploads in flight.
+
+    Returns:
+        Number of pages sent
+    """
+    page_iter = iter(pages)
+    pending: asyncio.Queue = asyncio.Queue(maxsize=PAGE_UPLOAD_CONCURRENCY)
+    semaphore = asyncio.Semaphore(PAGE_UPLOAD_CONCURRENCY)
+
+    async def _upload(img_data: bytes, img_name: str) -> str:
+        async with semaphore:
+            return await upload_media(settings, img_data, "image/jpeg", filename=img_name)
+
+    async def _render() -> None:
+        try:
+            while (page := await asyncio.to_thread(next, page_iter, None)) is not None:
+                img_data, img_name = page
+                upload = asyncio.create_task(_upload(img_data, img_name))
+                try:
+                    await pending.put((upload, img_name))
+                except BaseException:
+                    # Never queued, so the sender's cleanup can't see it
+                    upload.cancel()
+                    raise
+        finally:
+            # Wake the sender even if rendering failed; awaiting us re-raises
+            await pending.put(None)
+
+    renderer = asyncio.create_task(_render())
+    sent = 0
+    try:
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            upload, img_name = item
+            img_media_id = await upload
+            await send_image_message(settings, sender, img_media_id, caption=img_name)
+            sent += 1
+        await renderer
+    finally:
+        renderer.cancel()
+        while not pending.empty():
+            item = pending.get_nowait()
+            if item is not None:
+                item[0].cancel()
+
+    return sent
+
+
 def _get_pdf_page_count(pdf_data: bytes) -> int:
     """Get page count from PDF data."""
     try:
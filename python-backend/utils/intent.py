@@ -5,7 +5,9 @@ Supports English and Hindi keywords for all features.
 """
 
 from enum import Enum
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
 
 
 class Intent(Enum):
@@ -168,6 +170,34 @@ INTENT_KEYWORDS: List[Tuple[Intent, List[str]]] = [
     ]),
 ]
 
+# INTENT_KEYWORDS flattened into one priority-ordered sequence
+_KEYWORD_INTENTS: Tuple[Tuple[str, Intent], ...] = tuple(
+    (keyword, intent) for intent, keywords in INTENT_KEYWORDS for keyword in keywords
+)
+
+
+def _scan_keywords(text_lower: str) -> Intent:
+    for keyword, intent in _KEYWORD_INTENTS:
+        if keyword in text_lower:
+            return intent
+    return Intent.UNKNOWN
+
+
+# Messages that are exactly one keyword ("merge", "hi", "pdf to word") are
+# the common case; their scan result is resolved once here. A keyword can
+# contain a higher-priority one, so the value comes from the scan itself.
+_EXACT_KEYWORD_INTENTS: Dict[str, Intent] = {
+    keyword: _scan_keywords(keyword) for keyword, _ in _KEYWORD_INTENTS
+}
+
+# Short free-text messages repeat a lot ("hi there", "help me"); their scan
+# results are memoized. Longer messages are scanned directly so one user
+# can't fill the cache with unique paragraphs.
+INTENT_CACHE_SIZE = 4096
+INTENT_CACHE_MAX_LEN = 256
+
+_scan_keywords_cached = lru_cache(maxsize=INTENT_CACHE_SIZE)(_scan_keywords)
+
 
 def detect_intent(text: Optional[str]) -> Intent:
     """
@@ -187,12 +217,20 @@ def detect_intent(text: Optional[str]) -> Intent:
     if not text_lower:
         return Intent.UNKNOWN
 
-    for intent, keywords in INTENT_KEYWORDS:
-        for keyword in keywords:
-            if keyword in text_lower:
-                return intent
+    intent = _EXACT_KEYWORD_INTENTS.get(text_lower)
+    if intent is not None:
+        return intent
 
-    return Intent.UNKNOWN
+    if len(text_lower) <= INTENT_CACHE_MAX_LEN:
+        return _scan_keywords_cached(text_lower)
+    return _scan_keywords(text_lower)
+
+
+# Intents that can be triggered from a caption
+CAPTION_INTENTS = frozenset({
+    Intent.COMPRESS, Intent.MERGE, Intent.ENHANCE,
+    Intent.OCR, Intent.REMOVE_BG, Intent.SIGN_PDF,
+})
 
 
 def detect_intent_from_caption(caption: Optional[str]) -> Optional[Intent]:
@@ -205,38 +243,61 @@ def detect_intent_from_caption(caption: Optional[str]) -> Optional[Intent]:
         return None
 
     intent = detect_intent(caption)
-
-    # Intents that can be triggered from a caption
-    caption_intents = {
-        Intent.COMPRESS, Intent.MERGE, Intent.ENHANCE,
-        Intent.OCR, Intent.REMOVE_BG, Intent.SIGN_PDF,
-    }
-
-    if intent in caption_intents:
-        return intent
-
-    return None
+    return intent if intent in CAPTION_INTENTS else None
+
+
+# Interactive button IDs → intent, built once at import
+BUTTON_INTENT_MAP: Mapping[str, Intent] = MappingProxyType({
+    "btn_convert": Intent.CONVERT,
+    "btn_compress": Intent.COMPRESS,
+    "btn_merge": Intent.MERGE,
+    "btn_help": Intent.HELP,
+    # Rotation angles
+    "btn_rotate_90": Intent.ROTATE,
+    "btn_rotate_180": Intent.ROTATE,
+    "btn_rotate_270": Intent.ROTATE,
+    # Compression quality
+    "btn_quality_low": Intent.COMPRESS,
+    "btn_quality_medium": Intent.COMPRESS,
+    "btn_quality_high": Intent.COMPRESS,
+})
 
 
 def detect_intent_from_button(button_id: str) -> Intent:
     """
     Map a WhatsApp interactive button ID to an intent.
     """
-    button_map = {
-        "btn_convert": Intent.CONVERT,
-        "btn_compress": Intent.COMPRESS,
-        "btn_merge": Intent.MERGE,
-        "btn_help": Intent.HELP,
-        # Rotation angles
-        "btn_rotate_90": Intent.ROTATE,
-        "btn_rotate_180": Intent.ROTATE,
-        "btn_rotate_270": Intent.ROTATE,
-        # Compression quality
-        "btn_quality_low": Intent.COMPRESS,
-        "btn_quality_medium": Intent.COMPRESS,
-        "btn_quality_high": Intent.COMPRESS,
-    }
-    return button_map.get(button_id, Intent.UNKNOWN)
+    return BUTTON_INTENT_MAP.get(button_id, Intent.UNKNOWN)
+
+
+# Feature menu list reply IDs → intent, built once at import
+LIST_INTENT_MAP: Mapping[str, Intent] = MappingProxyType({
+    # Image tools
+    "list_convert": Intent.CONVERT,
+    "list_compress": Intent.COMPRESS,
+    "list_merge": Intent.MERGE,
+    "list_enhance": Intent.ENHANCE,
+    "list_remove_bg": Intent.REMOVE_BG,
+    # PDF tools
+    "list_split": Intent.SPLIT,
+    "list_rotate": Intent.ROTATE,
+    "list_reorder": Intent.REORDER,
+    "list_lock": Intent.LOCK_PDF,
+    "list_unlock": Intent.UNLOCK_PDF,
+    "list_ocr": Intent.OCR,
+    "list_page_numbers": Intent.PAGE_NUMBERS,
+    "list_watermark": Intent.WATERMARK,
+    "list_sign": Intent.SIGN_PDF,
+    "list_archive": Intent.PDF_ARCHIVE,
+    # Conversions
+    "list_pdf_to_word": Intent.PDF_TO_WORD,
+    "list_pdf_to_image": Intent.PDF_TO_IMAGE,
+    "list_pdf_to_ppt": Intent.PDF_TO_PPT,
+    "list_pdf_to_excel": Intent.PDF_TO_EXCEL,
+    "list_word_to_pdf": Intent.WORD_TO_PDF,
+    "list_excel_to_pdf": Intent.EXCEL_TO_PDF,
+    "list_ppt_to_pdf": Intent.PPT_TO_PDF,
+})
 
 
 def detect_intent_from_list(list_reply_id: str) -> Intent:
@@ -244,31 +305,4 @@ def detect_intent_from_list(list_reply_id: str) -> Intent:
     Map a WhatsApp list reply ID to an intent.
     Used for the feature menu list message.
     """
-    list_map = {
-        # Image tools
-        "list_convert": Intent.CONVERT,
-        "list_compress": Intent.COMPRESS,
-        "list_merge": Intent.MERGE,
-        "list_enhance": Intent.ENHANCE,
-        "list_remove_bg": Intent.REMOVE_BG,
-        # PDF tools
-        "list_split": Intent.SPLIT,
-        "list_rotate": Intent.ROTATE,
-        "list_reorder": Intent.REORDER,
-        "list_lock": Intent.LOCK_PDF,
-        "list_unlock": Intent.UNLOCK_PDF,
-        "list_ocr": Intent.OCR,
-        "list_page_numbers": Intent.PAGE_NUMBERS,
-        "list_watermark": Intent.WATERMARK,
-        "list_sign": Intent.SIGN_PDF,
-        "list_archive": Intent.PDF_ARCHIVE,
-        # Conversions
-        "list_pdf_to_word": Intent.PDF_TO_WORD,
-        "list_pdf_to_image": Intent.PDF_TO_IMAGE,
-        "list_pdf_to_ppt": Intent.PDF_TO_PPT,
-        "list_pdf_to_excel": Intent.PDF_TO_EXCEL,
-        "list_word_to_pdf": Intent.WORD_TO_PDF,
-        "list_excel_to_pdf": Intent.EXCEL_TO_PDF,
-        "list_ppt_to_pdf": Intent.PPT_TO_PDF,
-    }
-    return list_map.get(list_reply_id, Intent.UNKNOWN)
+    return LIST_INTENT_MAP.get(list_reply_id, Intent.UNKNOWN)
@@ -0,0 +1,72 @@
+"""
+Background sender for fire-and-forget WhatsApp API calls.
+Calls nobody waits on (read receipts / typing indicators) are queued and
+sent in concurrent batches, so the webhook handler doesn't spend a Graph
+API round trip on them before doing the real work.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from utils.batching import collect_batch
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_BATCH_SIZE = 20
+OUTBOUND_MAX_WAIT = 0.05  # seconds to wait for a batch to fill
+OUTBOUND_QUEUE_SIZE = 1000
+
+OutboundCall = Tuple[Callable[..., Awaitable[Any]], tuple, dict]
+
+# Set while run_outbound_sender() is running; send_in_background() then
+# hands calls to it instead of awaiting them itself.
+_outbound_queue: Optional[asyncio.Queue] = None
+
+
+async def send_in_background(func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> None:
+    """
+    Queue func(*args, **kwargs) for the background sender.
+    Awaited inline when the sender isn't running or its queue is full.
+    """
+    if _outbound_queue is not None:
+        try:
+            _outbound_queue.put_nowait((func, args, kwargs))
+            return
+        except asyncio.QueueFull:
+            logger.warning("Outbound queue full, sending inline")
+
+    await func(*args, **kwargs)
+
+
+async def _send_batch(batch: List[OutboundCall]) -> None:
+    results = await asyncio.gather(
+        *(func(*args, **kwargs) for func, args, kwargs in batch),
+        return_exceptions=True,
+    )
+    for (func, _, _), result in zip(batch, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Background {func.__name__} failed: {result}")
+
+
+async def run_outbound_sender() -> None:
+    """
+    Send queued calls in batches of up to OUTBOUND_BATCH_SIZE, waiting at
+    most OUTBOUND_MAX_WAIT for a batch to fill.
+    Runs until cancelled, then sends whatever is still queued.
+    """
+    global _outbound_queue
+    _outbound_queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+    batch: List[OutboundCall] = []
+
+    try:
+        while True:
+            await collect_batch(_outbound_queue, batch, OUTBOUND_BATCH_SIZE, OUTBOUND_MAX_WAIT)
+            pending, batch = batch, []
+            await _send_batch(pending)
+    finally:
+        queue, _outbound_queue = _outbound_queue, None
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch:
+            await _send_batch(batch)
@@ -10,7 +10,7 @@ import os
 import logging
 import subprocess
 import tempfile
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -49,35 +49,40 @@ def pdf_to_word(pdf_data: bytes) -> bytes:
         _safe_remove(tmp_docx_path)
 
 
-def pdf_to_images(pdf_data: bytes, fmt: str = "jpeg") -> List[Tuple[bytes, str]]:
+PAGES_PER_RENDER = 4
+
+
+def pdf_to_images(pdf_data: bytes, fmt: str = "jpeg") -> Iterator[Tuple[bytes, str]]:
     """
-    Convert each PDF page to an image.
+    Convert each PDF page to an image, yielding pages as they are rendered.
+    Pages are rasterized a few at a time so only a handful are held in memory.
 
     Args:
         pdf_data: Input PDF bytes
         fmt: Output format ("jpeg" or "png")
 
-    Returns:
-        List of (image_bytes, filename) tuples
+    Yields:
+        (image_bytes, filename) tuples in page order
     """
-    from pdf2image import convert_from_bytes
+    from pdf2image import convert_from_bytes, pdfinfo_from_bytes
 
     dpi = 200 if fmt == "jpeg" else 150
-    images = convert_from_bytes(pdf_data, dpi=dpi, fmt=fmt)
-
-    result = []
-    for i, img in enumerate(images):
-        buf = io.BytesIO()
-        ext = "jpg" if fmt == "jpeg" else "png"
-        save_kwargs = {"format": fmt.upper()}
-        if fmt == "jpeg":
-            save_kwargs["quality"] = 90
-        img.save(buf, **save_kwargs)
-        buf.seek(0)
-        result.append((buf.getvalue(), f"page_{i + 1}.{ext}"))
-
-    logger.info(f"Converted PDF to {len(result)} images ({fmt})")
-    return result
+    ext = "jpg" if fmt == "jpeg" else "png"
+    save_kwargs = {"format": fmt.upper()}
+    if fmt == "jpeg":
+        save_kwargs["quality"] = 90
+
+    page_count = pdfinfo_from_bytes(pdf_data)["Pages"]
+
+    for first in range(1, page_count + 1, PAGES_PER_RENDER):
+        last = min(first + PAGES_PER_RENDER - 1, page_count)
+        images = convert_from_bytes(pdf_data, dpi=dpi, fmt=fmt, first_page=first, last_page=last)
+        for offset, img in enumerate(images):
+            buf = io.BytesIO()
+            img.save(buf, **save_kwargs)
+            yield buf.getvalue(), f"page_{first + offset}.{ext}"
+
+    logger.info(f"Converted PDF to {page_count} images ({fmt})")
 
 
 def pdf_to_ppt(pdf_data: bytes) -> bytes:
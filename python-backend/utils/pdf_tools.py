@@ -5,6 +5,7 @@ All operations work in-memory — nothing stored on disk.
 """
 
 import io
+import re
 import logging
 from typing import List, Optional
 
@@ -396,20 +397,24 @@ def get_pdf_info(pdf_data: bytes) -> dict:
 
 # ── Helpers ────────────────────────────────────────────────────────
 
+# One comma-separated part of a page spec: "5" or "1-3"
+_PAGE_PART_RE = re.compile(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?")
+
+
 def _parse_page_spec(spec: str) -> List[int]:
     """
     Parse a page specification string into a list of page numbers.
     Examples: "1-3,5" → [1, 2, 3, 5], "1,2,3" → [1, 2, 3]
+    Parts that aren't a number or a range are ignored.
     """
-    pages = []
+    pages = set()
     for part in spec.split(","):
-        part = part.strip()
-        if "-" in part:
-            try:
-                start, end = part.split("-", 1)
-                pages.extend(range(int(start), int(end) + 1))
-            except ValueError:
-                continue
-        elif part.isdigit():
-            pages.append(int(part))
-    return sorted(set(pages))
+        match = _PAGE_PART_RE.fullmatch(part)
+        if match is None:
+            continue
+        start, end = match.groups()
+        if end is None:
+            pages.add(int(start))
+        else:
+            pages.update(range(int(start), int(end) + 1))
+    return sorted(pages)
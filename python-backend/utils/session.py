@@ -3,18 +3,37 @@ Per-user session state manager for WhatsApp conversations.
 Tracks conversation context, collected images/documents, and active intents.
 """
 
+import atexit
 import logging
+import os
+import tempfile
 import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import List, Optional, Set
 
 logger = logging.getLogger(__name__)
 
 # Session timeout in seconds (10 minutes)
 SESSION_TTL = 600
 
+# Most sessions held in memory; the least recently used is dropped past this
+MAX_SESSIONS = 100_000
 
-@dataclass
+# Most files one merge can collect
+MAX_SESSION_IMAGES = 50
+
+# PDFs held between messages are written to disk rather than kept in the
+# Python heap, so idle multi-turn sessions don't pin large blobs in memory.
+# Set DOCBOT_BLOB_DIR to move them, e.g. onto a tmpfs sized for the load.
+BLOB_DIR = os.environ.get("DOCBOT_BLOB_DIR") or os.path.join(tempfile.gettempdir(), "docbot_blobs")
+BLOB_PREFIX = "docbot_"
+
+
+# Slotted so each session is a fixed-size record without a per-instance
+# __dict__; most sessions only ever touch state and intent.
+@dataclass(slots=True)
 class Session:
     phone: str
     state: str = "idle"  # idle, collecting_images, awaiting_confirmation, processing, awaiting_input
@@ -23,8 +42,8 @@ class Session:
     created_at: float = field(default_factory=time.time)
     updated_at: float = field(default_factory=time.time)
 
-    # PDF data for tools that need to hold a PDF between messages
-    pdf_data: Optional[bytes] = None
+    # PDF held between messages for multi-step tools; see the pdf_data property
+    pdf_path: Optional[str] = None
     pdf_media_id: Optional[str] = None
     pdf_filename: Optional[str] = None
 
@@ -49,9 +68,20 @@ class Session:
     def image_count(self) -> int:
         return len(self.images)
 
+    @property
+    def pdf_data(self) -> Optional[bytes]:
+        """The stored PDF, read back from its blob file."""
+        return load_blob(self.pdf_path) if self.pdf_path else None
+
+    @pdf_data.setter
+    def pdf_data(self, data: Optional[bytes]) -> None:
+        if self.pdf_path:
+            discard_blob(self.pdf_path)
+        self.pdf_path = stash_blob(data) if data is not None else None
+
     @property
     def has_pdf(self) -> bool:
-        return self.pdf_data is not None
+        return self.pdf_path is not None
 
     @property
     def has_document(self) -> bool:
@@ -62,8 +92,65 @@ class Session:
         self.updated_at = time.time()
 
 
-# In-memory session store
-_sessions: Dict[str, Session] = {}
+# In-memory session store, least recently used first
+_sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+# Blob files written by this process, removed at exit
+_blob_paths: Set[str] = set()
+
+
+def stash_blob(data: bytes) -> str:
+    """
+    Write data to a new file in BLOB_DIR and return its path.
+    The name is a random token only; nothing from the webhook goes into it.
+    """
+    os.makedirs(BLOB_DIR, mode=0o700, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=BLOB_DIR, prefix=BLOB_PREFIX, delete=False) as f:
+        f.write(data)
+    _blob_paths.add(f.name)
+    return f.name
+
+
+def load_blob(path: str) -> bytes:
+    """Read a blob written by stash_blob()."""
+    return Path(path).read_bytes()
+
+
+def discard_blob(path: str) -> None:
+    """Delete a blob file, ignoring ones that are already gone."""
+    _blob_paths.discard(path)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@atexit.register
+def _discard_all_blobs() -> None:
+    for path in list(_blob_paths):
+        discard_blob(path)
+
+
+def sweep_stale_blobs() -> int:
+    """
+    Delete blob files left in BLOB_DIR by an earlier process that didn't
+    exit cleanly. Called once at startup, before any session stashes a PDF.
+    """
+    try:
+        names = os.listdir(BLOB_DIR)
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for name in names:
+        path = os.path.join(BLOB_DIR, name)
+        if name.startswith(BLOB_PREFIX) and path not in _blob_paths:
+            discard_blob(path)
+            removed += 1
+
+    if removed:
+        logger.info(f"Removed {removed} stale session blobs from {BLOB_DIR}")
+    return removed
 
 
 def get_session(phone: str) -> Session:
@@ -76,13 +163,24 @@ def get_session(phone: str) -> Session:
     if session is None or session.is_expired:
         if session and session.is_expired:
             logger.info(f"Session expired for {phone}, creating new one")
+            session.pdf_data = None
         session = Session(phone=phone)
         _sessions[phone] = session
+        _evict_oldest()
 
+    _sessions.move_to_end(phone)
     session.touch()
     return session
 
 
+def _evict_oldest() -> None:
+    """Drop least recently used sessions until at most MAX_SESSIONS remain."""
+    while len(_sessions) > MAX_SESSIONS:
+        phone, session = _sessions.popitem(last=False)
+        session.pdf_data = None
+        logger.info(f"Session store full, evicted session for {phone}")
+
+
 def update_session(phone: str, **kwargs) -> Session:
     """
     Update session fields and refresh timestamp.
@@ -93,13 +191,31 @@ def update_session(phone: str, **kwargs) -> Session:
         if hasattr(session, key):
             setattr(session, key, value)
 
-    session.touch()
+    return session
+
+
+def reset_session(phone: str, state: str, intent: Optional[str]) -> Session:
+    """
+    Start a new step: set state and intent and drop any collected images,
+    keeping the rest of the session as is.
+    """
+    session = get_session(phone)
+    session.state = state
+    session.intent = intent
+    session.images = []
     return session
 
 
 def add_image_to_session(phone: str, media_id: str, mime_type: str) -> Session:
-    """Add an image reference to the session's image collection."""
+    """
+    Add an image reference to the session's image collection.
+    References past MAX_SESSION_IMAGES are dropped.
+    """
     session = get_session(phone)
+    if len(session.images) >= MAX_SESSION_IMAGES:
+        logger.warning(f"Session for {phone} already holds {MAX_SESSION_IMAGES} files, ignoring {media_id}")
+        session.touch()
+        return session
     session.images.append({"media_id": media_id, "mime_type": mime_type})
     session.touch()
     logger.info(f"Added image to session for {phone}, total: {session.image_count}")
@@ -129,9 +245,24 @@ def clear_session(phone: str) -> Session:
     return session
 
 
+def _count_expired() -> int:
+    """
+    Count expired sessions at the front of the store.
+    Every touch() follows a get_session() that moves the session to the end,
+    so _sessions is ordered by updated_at and the expired ones are a prefix.
+    """
+    cutoff = time.time() - SESSION_TTL
+    count = 0
+    for session in _sessions.values():
+        if session.updated_at >= cutoff:
+            break
+        count += 1
+    return count
+
+
 def get_active_session_count() -> int:
     """Return count of non-expired sessions."""
-    return sum(1 for s in _sessions.values() if not s.is_expired)
+    return len(_sessions) - _count_expired()
 
 
 def get_all_phones() -> List[str]:
@@ -140,12 +271,13 @@ def get_all_phones() -> List[str]:
 
 
 def cleanup_expired() -> int:
-    """Remove all expired sessions from memory."""
-    expired = [phone for phone, s in _sessions.items() if s.is_expired]
-    for phone in expired:
-        del _sessions[phone]
+    """Remove all expired sessions from memory, oldest first."""
+    expired = _count_expired()
+    for _ in range(expired):
+        _, session = _sessions.popitem(last=False)
+        session.pdf_data = None
 
     if expired:
-        logger.info(f"Cleaned up {len(expired)} expired sessions")
+        logger.info(f"Cleaned up {expired} expired sessions")
 
-    return len(expired)
+    return expired
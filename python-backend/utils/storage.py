@@ -3,13 +3,21 @@ File-based storage for settings and conversion logs.
 Enhanced with feature tracking, processing time, and error logging.
 """
 
+import asyncio
+import csv
+import io
 import json
 import logging
+import os
+import tempfile
+import threading
 from collections import Counter
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
 from pathlib import Path
 
+from utils.batching import collect_batch
+
 logger = logging.getLogger(__name__)
 
 # Storage directory
@@ -55,6 +63,18 @@ def get_settings() -> Dict[str, Any]:
 
 # ── Conversion Logging ─────────────────────────────────────────────
 
+LOG_BATCH_SIZE = 64
+LOG_MAX_WAIT = 0.1  # seconds to wait for a batch to fill
+
+# The log writer's inbox, or None when run_conversion_log_writer() isn't
+# running and log_conversion() writes the file directly
+_log_queue: Optional[asyncio.Queue] = None
+
+# Serializes the load → modify → save in log_conversions_bulk(), which runs
+# on worker threads as well as the event loop thread
+_conversions_lock = threading.Lock()
+
+
 def log_conversion(
     conversion_id: str,
     phone_number: str,
@@ -68,45 +88,93 @@ def log_conversion(
     output_file_size: Optional[int] = None,
 ) -> None:
     """Log a conversion with extended fields."""
-    conversions = _load_conversions()
+    record = {
+        "id": conversion_id,
+        "phone_number": phone_number,
+        "status": status,
+        "file_size": file_size,
+        "feature": feature,
+        "input_type": input_type,
+        "output_type": output_type,
+        "processing_time_ms": processing_time_ms,
+        "error_message": error_message,
+        "output_file_size": output_file_size,
+        "timestamp": datetime.now().isoformat(),
+    }
 
-    existing = next((c for c in conversions if c["id"] == conversion_id), None)
-
-    if existing:
-        existing["status"] = status
-        existing["file_size"] = file_size
-        existing["updated_at"] = datetime.now().isoformat()
-        if feature:
-            existing["feature"] = feature
-        if input_type:
-            existing["input_type"] = input_type
-        if output_type:
-            existing["output_type"] = output_type
-        if processing_time_ms is not None:
-            existing["processing_time_ms"] = processing_time_ms
-        if error_message:
-            existing["error_message"] = error_message
-        if output_file_size is not None:
-            existing["output_file_size"] = output_file_size
+    if _log_queue is not None:
+        _log_queue.put_nowait(record)
     else:
-        conversions.append({
-            "id": conversion_id,
-            "phone_number": phone_number,
-            "status": status,
-            "file_size": file_size,
-            "feature": feature,
-            "input_type": input_type,
-            "output_type": output_type,
-            "processing_time_ms": processing_time_ms,
-            "error_message": error_message,
-            "output_file_size": output_file_size,
-            "timestamp": datetime.now().isoformat(),
-        })
+        log_conversions_bulk([record])
+
+
+def log_conversions_bulk(records: List[Dict[str, Any]]) -> None:
+    """Apply several log_conversion() records with a single load and save."""
+    with _conversions_lock:
+        _apply_records(records)
+
+
+def _apply_records(records: List[Dict[str, Any]]) -> None:
+    conversions = _load_conversions()
+    by_id = {c["id"]: c for c in conversions}
+
+    for record in records:
+        existing = by_id.get(record["id"])
+
+        if existing:
+            existing["status"] = record["status"]
+            existing["file_size"] = record["file_size"]
+            existing["updated_at"] = record["timestamp"]
+            for key in ("feature", "input_type", "output_type", "error_message"):
+                if record[key]:
+                    existing[key] = record[key]
+            for key in ("processing_time_ms", "output_file_size"):
+                if record[key] is not None:
+                    existing[key] = record[key]
+        else:
+            entry = dict(record)
+            conversions.append(entry)
+            by_id[entry["id"]] = entry
 
     conversions = conversions[-1000:]
     _save_conversions(conversions)
 
 
+async def run_conversion_log_writer() -> None:
+    """
+    Drain queued log_conversion() records to disk in batches of up to
+    LOG_BATCH_SIZE, waiting at most LOG_MAX_WAIT for a batch to fill so a
+    conversion's pending and final records usually share one file write.
+    Runs until cancelled, then flushes whatever is still queued.
+    """
+    global _log_queue
+    _log_queue = asyncio.Queue()
+    batch: List[Dict[str, Any]] = []
+    write: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            await collect_batch(_log_queue, batch, LOG_BATCH_SIZE, LOG_MAX_WAIT)
+            pending, batch = batch, []
+            # Shielded so cancelling the writer never abandons a half-done batch
+            write = asyncio.ensure_future(asyncio.to_thread(log_conversions_bulk, pending))
+            try:
+                await asyncio.shield(write)
+            except Exception as e:
+                logger.error(f"Error writing conversion logs: {e}")
+    finally:
+        if write is not None and not write.done():
+            try:
+                await write
+            except Exception as e:
+                logger.error(f"Error writing conversion logs: {e}")
+        queue, _log_queue = _log_queue, None
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch:
+            log_conversions_bulk(batch)
+
+
 # ── Stats ──────────────────────────────────────────────────────────
 
 def get_stats() -> Dict[str, Any]:
@@ -315,28 +383,32 @@ def get_error_tracking() -> Dict[str, Any]:
     }
 
 
-def export_conversions_csv() -> str:
-    """Export all conversions as CSV string."""
-    conversions = _load_conversions()
-    headers = [
-        "id", "timestamp", "phone_number", "status", "feature",
-        "file_size", "output_file_size", "processing_time_ms",
-        "input_type", "output_type", "error_message",
-    ]
+CSV_HEADERS = [
+    "id", "timestamp", "phone_number", "status", "feature",
+    "file_size", "output_file_size", "processing_time_ms",
+    "input_type", "output_type", "error_message",
+]
+
 
-    lines = [",".join(headers)]
-    for c in sorted(conversions, key=lambda x: x["timestamp"], reverse=True):
-        row = []
-        for h in headers:
-            val = c.get(h, "")
-            val = str(val) if val is not None else ""
-            # Escape commas and quotes in CSV
-            if "," in val or '"' in val:
-                val = '"' + val.replace('"', '""') + '"'
-            row.append(val)
-        lines.append(",".join(row))
+def iter_conversions_csv() -> Iterator[str]:
+    """Yield the conversions CSV one line at a time, newest first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
 
-    return "\n".join(lines)
+    def _line(values: List[Any]) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield _line(CSV_HEADERS)
+    for c in sorted(_load_conversions(), key=lambda x: x["timestamp"], reverse=True):
+        yield _line(["" if c.get(h) is None else c.get(h) for h in CSV_HEADERS])
+
+
+def export_conversions_csv() -> str:
+    """Export all conversions as CSV string."""
+    return "".join(iter_conversions_csv()).rstrip("\n")
 
 
 # ── Internal helpers ───────────────────────────────────────────────
@@ -355,9 +427,18 @@ def _load_conversions() -> List[Dict[str, Any]]:
 
 
 def _save_conversions(conversions: List[Dict[str, Any]]) -> None:
-    """Save conversions to file."""
-    with open(CONVERSIONS_FILE, "w") as f:
-        json.dump(conversions, f, indent=2)
+    """
+    Save conversions to file. Written to a temp file and renamed over the
+    old one, so readers on other threads never see a half-written log.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=CONVERSIONS_FILE.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(conversions, f, indent=2)
+        os.replace(tmp_path, CONVERSIONS_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def _mask_phone(phone: str) -> str:
@@ -2,22 +2,60 @@
 WhatsApp Cloud API utility functions.
 Handles all communication with Meta's WhatsApp Business API.
 All outbound API calls use exponential backoff retry.
+JSON payloads are serialized with orjson.
 """
 
+import hmac
+import io
 import httpx
 import logging
-from typing import Dict, List, Optional
+import orjson
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
 
 from utils.retry import retry
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    logger.info("h2 not installed — Graph API calls use HTTP/1.1")
+
 BASE_URL = "https://graph.facebook.com/v18.0"
 
+# One pooled client for every Graph API call, so uploads, downloads and
+# sends reuse warm TLS connections instead of handshaking each time.
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+            timeout=30.0,
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client; called on application shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 async def verify_webhook_token(received_token: str, expected_token: str) -> bool:
-    """Verify the webhook token matches."""
-    return received_token == expected_token
+    """Verify the webhook token matches, in constant time. Never matches if either is empty."""
+    if not received_token or not expected_token:
+        return False
+    return hmac.compare_digest(received_token.encode(), expected_token.encode())
 
 
 @retry(retries=3, base_delay=1.0, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -37,30 +75,91 @@ async def send_typing_indicator(settings: dict, recipient: str, message_id: str)
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{BASE_URL}/{phone_number_id}/messages",
-                headers=headers,
-                json={
-                    "messaging_product": "whatsapp",
-                    "status": "read",
-                    "message_id": message_id,
-                    "typing_indicator": {
-                        "type": "text",
-                    },
+        client = _client()
+        await client.post(
+            f"{BASE_URL}/{phone_number_id}/messages",
+            headers=headers,
+            content=orjson.dumps({
+                "messaging_product": "whatsapp",
+                "status": "read",
+                "message_id": message_id,
+                "typing_indicator": {
+                    "type": "text",
                 },
-                timeout=10.0,
-            )
+            }),
+            timeout=10.0,
+        )
         logger.info(f"Sent typing indicator to {recipient}")
     except Exception as e:
         logger.warning(f"Failed to send typing indicator: {e}")
 
 
-@retry(retries=3, base_delay=1.0, exceptions=(httpx.HTTPError, httpx.TimeoutException))
-async def download_media(settings: dict, media_id: str) -> bytes:
+# Recently downloaded media, so a redelivered webhook or a repeated step
+# in a multi-turn flow doesn't fetch the same file twice.
+MEDIA_CACHE_MAX_ITEMS = 64
+MEDIA_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+_media_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_media_cache_bytes = 0
+
+
+def _cache_media(media_id: str, data: bytes) -> None:
+    """Add downloaded media to the LRU cache, evicting the oldest entries."""
+    global _media_cache_bytes
+
+    if len(data) > MEDIA_CACHE_MAX_BYTES:
+        return
+
+    old = _media_cache.pop(media_id, None)
+    if old is not None:
+        _media_cache_bytes -= len(old)
+
+    _media_cache[media_id] = data
+    _media_cache_bytes += len(data)
+
+    while len(_media_cache) > MEDIA_CACHE_MAX_ITEMS or _media_cache_bytes > MEDIA_CACHE_MAX_BYTES:
+        _, evicted = _media_cache.popitem(last=False)
+        _media_cache_bytes -= len(evicted)
+
+
+class MediaTooLargeError(ValueError):
+    """Raised by download_media() when a file is bigger than max_bytes."""
+
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"Media is {size} bytes, limit is {max_bytes}")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+def _check_media_size(size: Optional[int], max_bytes: Optional[int]) -> None:
+    if max_bytes is not None and size is not None and size > max_bytes:
+        raise MediaTooLargeError(size, max_bytes)
+
+
+async def download_media(settings: dict, media_id: str, max_bytes: Optional[int] = None) -> bytes:
     """
     Download media from WhatsApp using the media ID.
+    Served from the in-memory LRU cache when the same media ID was fetched recently.
+    Raises MediaTooLargeError as soon as the file is known to exceed max_bytes.
+    """
+    data = _media_cache.get(media_id)
+    if data is not None:
+        _media_cache.move_to_end(media_id)
+        _check_media_size(len(data), max_bytes)
+        return data
+
+    data = await _fetch_media(settings, media_id, max_bytes)
+    _cache_media(media_id, data)
+    return data
+
+
+@retry(retries=3, base_delay=1.0, exceptions=(httpx.HTTPError, httpx.TimeoutException))
+async def _fetch_media(settings: dict, media_id: str, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Fetch media from the Graph API.
     First gets the media URL, then downloads the actual file.
+    Oversized files are rejected from the reported file_size before any of
+    the body is fetched, or mid-stream if the size wasn't reported.
     """
     access_token = settings.get("access_token")
 
@@ -69,30 +168,34 @@ async def download_media(settings: dict, media_id: str) -> bytes:
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with httpx.AsyncClient() as client:
-        # Step 1: Get media URL
-        url_response = await client.get(
-            f"{BASE_URL}/{media_id}",
-            headers=headers,
-            timeout=30.0
-        )
-        url_response.raise_for_status()
-        media_url = url_response.json().get("url")
+    client = _client()
+    # Step 1: Get media URL
+    url_response = await client.get(
+        f"{BASE_URL}/{media_id}",
+        headers=headers,
+        timeout=30.0
+    )
+    url_response.raise_for_status()
+    media_info = url_response.json()
+    media_url = media_info.get("url")
 
-        if not media_url:
-            raise ValueError("Could not get media URL")
+    if not media_url:
+        raise ValueError("Could not get media URL")
 
-        logger.info(f"Downloading media from: {media_url[:50]}...")
+    _check_media_size(media_info.get("file_size"), max_bytes)
 
-        # Step 2: Download the actual file
-        file_response = await client.get(
-            media_url,
-            headers=headers,
-            timeout=60.0
-        )
+    logger.info(f"Downloading media from: {media_url[:50]}...")
+
+    # Step 2: Download the actual file, streaming it into one growing
+    # buffer rather than holding every chunk and then joining them
+    buffer = io.BytesIO()
+    async with client.stream("GET", media_url, headers=headers, timeout=60.0) as file_response:
         file_response.raise_for_status()
+        async for chunk in file_response.aiter_bytes():
+            buffer.write(chunk)
+            _check_media_size(buffer.tell(), max_bytes)
 
-        return file_response.content
+    return buffer.getvalue()
 
 
 @retry(retries=3, base_delay=1.0, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -108,25 +211,25 @@ async def upload_media(settings: dict, file_data: bytes, mime_type: str, filenam
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/media",
-            headers=headers,
-            files={
-                "file": (filename, file_data, mime_type),
-            },
-            data={
-                "messaging_product": "whatsapp",
-                "type": mime_type,
-            },
-            timeout=60.0
-        )
-        response.raise_for_status()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/media",
+        headers=headers,
+        files={
+            "file": (filename, file_data, mime_type),
+        },
+        data={
+            "messaging_product": "whatsapp",
+            "type": mime_type,
+        },
+        timeout=60.0
+    )
+    response.raise_for_status()
 
-        media_id = response.json().get("id")
-        logger.info(f"Uploaded media with ID: {media_id}")
+    media_id = response.json().get("id")
+    logger.info(f"Uploaded media with ID: {media_id}")
 
-        return media_id
+    return media_id
 
 
 @retry(retries=2, base_delay=0.5, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -163,17 +266,17 @@ async def send_document_message(
     if caption:
         payload["document"]["caption"] = caption
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/messages",
-            headers=headers,
-            json=payload,
-            timeout=30.0
-        )
-        response.raise_for_status()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/messages",
+        headers=headers,
+        content=orjson.dumps(payload),
+        timeout=30.0
+    )
+    response.raise_for_status()
 
-        logger.info(f"Sent document to {recipient}")
-        return response.json()
+    logger.info(f"Sent document to {recipient}")
+    return response.json()
 
 
 @retry(retries=2, base_delay=0.5, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -181,7 +284,7 @@ async def send_button_message(
     settings: dict,
     recipient: str,
     body_text: str,
-    buttons: List[Dict],
+    buttons: Sequence[Dict],
 ):
     """
     Send an interactive button message (max 3 buttons).
@@ -217,17 +320,17 @@ async def send_button_message(
         },
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/messages",
-            headers=headers,
-            json=payload,
-            timeout=30.0,
-        )
-        response.raise_for_status()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/messages",
+        headers=headers,
+        content=orjson.dumps(payload),
+        timeout=30.0,
+    )
+    response.raise_for_status()
 
-        logger.info(f"Sent button message to {recipient}")
-        return response.json()
+    logger.info(f"Sent button message to {recipient}")
+    return response.json()
 
 
 @retry(retries=2, base_delay=0.5, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -236,7 +339,7 @@ async def send_list_message(
     recipient: str,
     body_text: str,
     button_text: str,
-    sections: List[Dict],
+    sections: Sequence[Dict],
     header: Optional[str] = None,
     footer: Optional[str] = None,
 ):
@@ -286,17 +389,17 @@ async def send_list_message(
         "interactive": interactive,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/messages",
-            headers=headers,
-            json=payload,
-            timeout=30.0,
-        )
-        response.raise_for_status()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/messages",
+        headers=headers,
+        content=orjson.dumps(payload),
+        timeout=30.0,
+    )
+    response.raise_for_status()
 
-        logger.info(f"Sent list message to {recipient}")
-        return response.json()
+    logger.info(f"Sent list message to {recipient}")
+    return response.json()
 
 
 @retry(retries=2, base_delay=0.5, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -321,17 +424,17 @@ async def send_text_message(settings: dict, recipient: str, text: str):
         "text": {"body": text}
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/messages",
-            headers=headers,
-            json=payload,
-            timeout=30.0
-        )
-        response.raise_for_status()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/messages",
+        headers=headers,
+        content=orjson.dumps(payload),
+        timeout=30.0
+    )
+    response.raise_for_status()
 
-        logger.info(f"Sent text message to {recipient}")
-        return response.json()
+    logger.info(f"Sent text message to {recipient}")
+    return response.json()
 
 
 @retry(retries=2, base_delay=0.5, exceptions=(httpx.HTTPError, httpx.TimeoutException))
@@ -360,14 +463,14 @@ async def send_image_message(settings: dict, recipient: str, media_id: str, capt
         "image": image_payload,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/{phone_number_id}/messages",
-            headers=headers,
-            json=payload,
-            timeout=30.0,
-        )
-        response.raise_for_status()
-
-        logger.info(f"Sent image message to {recipient}")
-        return response.json()
+    client = _client()
+    response = await client.post(
+        f"{BASE_URL}/{phone_number_id}/messages",
+        headers=headers,
+        content=orjson.dumps(payload),
+        timeout=30.0,
+    )
+    response.raise_for_status()
+
+    logger.info(f"Sent image message to {recipient}")
+    return response.json()
@@ -0,0 +1,70 @@
+"""
+Process pool for CPU-bound document work.
+Keeps Pillow, OpenCV and pikepdf transforms off the event loop (and off the
+GIL) so one slow conversion doesn't stall replies to other users.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CPU_WORKERS = os.cpu_count() or 1
+
+# Workers come from a clean forkserver process rather than a fork() of the
+# server, which already runs to_thread() workers and httpx and could hand a
+# child a lock held by one of those threads
+POOL_START_METHOD = "forkserver"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _ensure_pool() -> ProcessPoolExecutor:
+    """Create the worker pool on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+        )
+        logger.info(f"Started CPU worker pool with {CPU_WORKERS} processes")
+    return _pool
+
+
+def _is_picklable_function(func: Callable) -> bool:
+    """Only plain module-level functions can be shipped to a worker process."""
+    return isinstance(func, types.FunctionType) and "<locals>" not in func.__qualname__
+
+
+async def run_cpu_bound(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run func(*args, **kwargs) in the worker process pool and await the result.
+    Callables that can't be pickled by reference (bound methods, closures,
+    test doubles) run on a thread instead.
+    """
+    call = functools.partial(func, *args, **kwargs)
+
+    if not _is_picklable_function(func):
+        return await asyncio.to_thread(call)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_ensure_pool(), call)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool next time
+        shutdown_pool()
+        raise
+
+
+def shutdown_pool() -> None:
+    """Stop the worker pool, if one was started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None